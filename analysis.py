@@ -0,0 +1,158 @@
+# analysis.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import requests
+from requests.adapters import HTTPAdapter
+from output_reducer import mask_volatile, reduce_output
+
+# --- Analysis Service ---
+# AI analysis of command output goes through one shared service instead of ad
+# hoc requests.post calls. Requests use a pooled session with connect/read
+# timeouts and run on a small worker pool, so callers get a Future and can
+# carry on (pipelines attach the analysis to the step once it arrives).
+# Results are cached by a hash of the normalized output: timestamps, UUIDs,
+# hex ids and ANSI colour codes are masked first, so a nightly job printing
+# the same thing with a different date is answered from the cache.
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+DEFAULT_MODEL = 'gemini-1.5-flash-latest'
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_TIMEOUT = 60
+DEFAULT_CACHE_SIZE = 512
+# A week, so daily and nightly schedules hit the cache.
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_WORKERS = 4
+
+ANALYSIS_PROMPT = ("As an expert DevOps engineer, analyze the following command line output. Provide a concise summary "
+                   "and potential troubleshooting steps in Markdown.\n\nOutput:\n---\n{output}\n---")
+
+class AnalysisError(Exception):
+    pass
+
+class AnalysisTimeout(AnalysisError):
+    pass
+
+def normalize_output(text):
+    """The output with run-to-run noise masked; used only for the cache key, never sent to the model."""
+    return '\n'.join(line.strip() for line in mask_volatile((text or '').strip()).splitlines())
+
+class AnalysisService:
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    # --- Public API ---
+    def submit(self, config, output, api_key=None):
+        """
+        Starts analysing `output` (reduced to REDUCE_MAX_TOKENS first) and returns a Future for the Markdown text.
+        The Future fails with AnalysisError when the key is missing or the request fails.
+        Identical (normalized) outputs share one request and are served from the cache.
+        """
+        api_key = api_key or config.get('GEMINI_API_KEY')
+        if not api_key:
+            return self._failed(AnalysisError("Gemini API key not configured."))
+        model = config.get('GEMINI_MODEL', DEFAULT_MODEL)
+        output = reduce_output(config, output)
+        key = hashlib.sha256(f"{model}\0{ANALYSIS_PROMPT}\0{normalize_output(output)}".encode()).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(cached[1])
+                return future
+            if key in self._inflight:
+                self.hits += 1
+                return self._inflight[key]
+            payload = {"contents": [{"parts": [{"text": ANALYSIS_PROMPT.format(output=output)}]}]}
+            try:
+                future = self._executor.submit(self._analyze, config, key, api_key, model, payload)
+            except RuntimeError:
+                # The executor refuses new work once stop() has been called.
+                return self._failed(AnalysisError("Analysis service is shutting down."))
+            self.misses += 1
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def analyze(self, config, output, api_key=None):
+        """Blocking form of submit(); raises AnalysisError."""
+        return wait_for(self.submit(config, output, api_key), wait_timeout(config))
+
+    def generate(self, config, api_key, payload, model=None):
+        """Sends a raw generateContent request through the pooled session and returns the first candidate's text."""
+        model = model or config.get('GEMINI_MODEL', DEFAULT_MODEL)
+        try:
+            response = self.session.post(GEMINI_URL.format(model=model), json=payload, headers={'x-goog-api-key': api_key},
+                                         timeout=(DEFAULT_CONNECT_TIMEOUT, _timeout(config)))
+            response.raise_for_status()
+            return response.json()['candidates'][0]['content']['parts'][0]['text']
+        except requests.Timeout:
+            raise AnalysisTimeout(f"Gemini did not answer within {_timeout(config):g}s.")
+        except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+            raise AnalysisError(str(e))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache), 'in_flight': len(self._inflight)}
+
+    def stop(self, wait=True):
+        """Waits for analyses already running; further submits fail."""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    # --- Worker ---
+    def _analyze(self, config, key, api_key, model, payload):
+        text = self.generate(config, api_key, payload, model)
+        size = int(config.get('ANALYSIS_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        ttl = float(config.get('ANALYSIS_CACHE_TTL', DEFAULT_CACHE_TTL))
+        with self._lock:
+            # Failures raise above and are never cached.
+            self._cache[key] = (time.monotonic() + ttl, text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > size:
+                self._cache.popitem(last=False)
+        return text
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _failed(error):
+        future = Future()
+        future.set_exception(error)
+        return future
+
+def _timeout(config):
+    return float(config.get('ANALYSIS_TIMEOUT', DEFAULT_TIMEOUT))
+
+def wait_timeout(config):
+    """How long a caller that needs the result should wait for a request that has already started."""
+    return DEFAULT_CONNECT_TIMEOUT + _timeout(config)
+
+def wait_for(future, timeout=None):
+    """The Future's text; raises AnalysisError if it failed, AnalysisTimeout if it isn't done within `timeout` seconds."""
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        raise AnalysisTimeout(f"Analysis not ready after {timeout:g}s.")
+
+def analysis_text(future, timeout=None):
+    """The analysis for reports: the text, or a one-line explanation of why there is none."""
+    try:
+        return wait_for(future, timeout)
+    except AnalysisError as e:
+        return f"AI analysis failed: {e}"
+
+# Shared instance used by the web app, pipelines and the scheduler.
+analysis_service = AnalysisService()
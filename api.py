@@ -8,7 +8,9 @@
 import os
 import sys
 import uvicorn
-import paramiko
+from ssh_pool import ssh_pool
+from output_stream import stream_command
+from database import DATABASE_URI, engine_options
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, ConfigDict
@@ -30,8 +32,8 @@ app = FastAPI(
 # --- Database Setup ---
 # This section connects directly to your existing app.db database.
 try:
-    DATABASE_URL = "sqlite:///app.db"
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    DATABASE_URL = DATABASE_URI
+    engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 except Exception as e:
@@ -110,15 +112,9 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
 def execute_ssh_command(host: Host, script: Script, password: Optional[str]):
     """Connects to a host and executes a single script command."""
     try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(host.hostname, port=host.port, username=host.username, password=password, timeout=10)
-        
-        stdin, stdout, stderr = client.exec_command(script.path)
-        output = stdout.read().decode('utf-8')
-        error = stderr.read().decode('utf-8')
-        
-        client.close()
+        # Connections are pooled per (hostname, port, username), so pipeline steps on one host share a transport.
+        stdin, stdout, stderr = ssh_pool.exec_command(host.hostname, host.username, script.path, port=host.port, password=password)
+        output, error, _ = stream_command(stdout)
         
         if error:
             # Return error but don't raise exception unless connection fails
@@ -134,6 +130,10 @@ def execute_ssh_command(host: Host, script: Script, password: Optional[str]):
 def read_root():
     return {"status": "Remote Script Launcher API is running."}
 
+@app.get("/ssh-pool", tags=["Status"], summary="SSH connection pool counters")
+def ssh_pool_stats(token: str = Depends(get_current_user)):
+    return ssh_pool.stats()
+
 # --- Host Management ---
 @app.post("/hosts", status_code=201, response_model=HostModel, tags=["Hosts"], summary="Add a new host")
 def add_host(host: HostModel, db = Depends(get_db), token: str = Depends(get_current_user)):
@@ -1,37 +1,50 @@
 # app.py
 import os
 import json
+import base64
 import subprocess
 import shlex
 import tempfile
-import requests
-import paramiko
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import time
+import socket
+from collections import deque
+from queue import SimpleQueue
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for
 from flask_socketio import SocketIO
 from flask_login import LoginManager, login_required, current_user, login_user, logout_user
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
 
 # --- Flask-RESTX Import ---
 from flask_restx import Api, Resource
 
 # --- Model and Blueprint Imports ---
 from models import db, User, Group, SSHHost, SavedScript, Schedule, Pipeline
+from schedule_triggers import build_trigger, describe_trigger
 from auth import auth_bp
 # We will now import the namespace from pipeline.py instead of the blueprint
-from pipeline import pipelines_ns, setup_pipeline_dependencies
+from pipeline import pipelines_ns, setup_pipeline_dependencies, socket_of_current_user
 from git_scripts import git_bp
+from ssh_pool import ssh_pool
+from config_service import load_config, save_config
+from database import configure_app, migrate_database
+from job_queue import get_job_queue
+from http_cache import conditional_get
+from output_stream import ChunkEmitter, stream_command, DEFAULT_MAX_RATE
+from output_store import output_captures, get_output_store
+from output_aggregate import aggregate_results, AGGREGATE_MODES
+from analysis import analysis_service, AnalysisError, AnalysisTimeout
 
 # --- App Initialization & Config ---
 app = Flask(__name__)
-basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'app.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_app(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a_very_secret_key_change_me_for_production')
-CONFIG_FILE = os.path.join(basedir, 'config.json')
 
 # --- Extension Initialization ---
-db.init_app(app)
-socketio = SocketIO(app)
+# With a message queue (e.g. redis://), worker processes can emit to browsers connected to this server.
+socketio = SocketIO(app, message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.init_app(app)
@@ -53,7 +66,10 @@ users_ns = api.namespace('users', description='User management operations')
 groups_ns = api.namespace('groups', description='Group management operations')
 hosts_ns = api.namespace('hosts', description='Manage SSH hosts')
 scripts_ns = api.namespace('scripts', description='Manage saved scripts')
+schedules_ns = api.namespace('schedules', description='Manage scheduled script runs')
 run_ns = api.namespace('run', description='Remote command and script execution')
+jobs_ns = api.namespace('jobs', description='Status of queued executions')
+outputs_ns = api.namespace('outputs', description='Full output of executions that exceeded the size caps')
 
 # --- Add Namespaces to the API ---
 # This registers the routes defined in each namespace with the main API.
@@ -62,7 +78,10 @@ api.add_namespace(users_ns)
 api.add_namespace(groups_ns)
 api.add_namespace(hosts_ns)
 api.add_namespace(scripts_ns)
+api.add_namespace(schedules_ns)
 api.add_namespace(run_ns)
+api.add_namespace(jobs_ns)
+api.add_namespace(outputs_ns)
 # Register the imported pipeline namespace
 api.add_namespace(pipelines_ns)
 
@@ -76,8 +95,6 @@ def load_user(user_id):
 # --- Blueprint and Dependency Registration ---
 # The pipeline runner needs access to the app and socketio instances.
 setup_pipeline_dependencies(app, socketio)
-# The git blueprint needs access to the config loader.
-git_bp.load_config = lambda: load_config()
 
 # Register the blueprints for non-API routes (like authentication and git operations).
 app.register_blueprint(auth_bp)
@@ -85,18 +102,6 @@ app.register_blueprint(git_bp)
 
 
 # --- Helper Functions ---
-def load_config():
-    """Loads the main configuration file."""
-    if not os.path.exists(CONFIG_FILE):
-        return {}
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
-
-def save_config(config_data):
-    """Saves data to the main configuration file."""
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config_data, f, indent=4)
-
 # --- Standard Web Page Routes ---
 # These routes serve the HTML pages for the user interface.
 @app.route('/')
@@ -104,18 +109,17 @@ def save_config(config_data):
 def index():
     group_id = current_user.group_id
     hosts = SSHHost.query.filter_by(group_id=group_id).order_by(SSHHost.friendly_name).all()
-    scripts = SavedScript.query.filter_by(group_id=group_id).order_by(SavedScript.name).all()
     pipelines = Pipeline.query.filter_by(group_id=group_id).order_by(Pipeline.name).all()
-    return render_template('index.html', hosts=hosts, scripts=scripts, pipelines=pipelines, username=current_user.username)
+    # Scripts are listed by app.js through /api/scripts.
+    return render_template('index.html', hosts=hosts, pipelines=pipelines, username=current_user.username)
 
 @app.route('/pipeline-editor')
 @app.route('/pipeline-editor/<int:pipeline_id>')
 @login_required
 def pipeline_editor(pipeline_id=None):
     group_id = current_user.group_id
-    hosts = SSHHost.query.filter_by(group_id=group_id).all()
-    scripts = SavedScript.query.filter_by(group_id=group_id).all()
-    return render_template('pipeline.html', pipeline_id=pipeline_id, hosts=hosts, scripts=scripts)
+    hosts = SSHHost.query.filter_by(group_id=group_id).order_by(SSHHost.friendly_name).all()
+    return render_template('pipeline.html', pipeline_id=pipeline_id, hosts=hosts)
 
 @app.route('/users')
 @login_required
@@ -240,15 +244,16 @@ class AISuggestScript(Resource):
         if not prompt: return {'status': 'error', 'message': 'Prompt cannot be empty.'}, 400
         
         system_prompt = "You are an expert DevOps engineer..." # Your prompt here
+        payload = {"contents": [{"parts": [{"text": system_prompt}]}], "generationConfig": {"responseMimeType": "application/json"}}
         try:
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}"
-            payload = {"contents": [{"parts": [{"text": system_prompt}]}], "generationConfig": {"responseMimeType": "application/json"}}
-            response = requests.post(api_url, json=payload, headers={'Content-Type': 'application/json'})
-            response.raise_for_status()
-            suggestions = json.loads(response.json()['candidates'][0]['content']['parts'][0]['text'])
-            return {'status': 'success', 'suggestions': suggestions}
-        except Exception as e:
+            suggestions = json.loads(analysis_service.generate(load_config(), api_key, payload))
+        except AnalysisTimeout as e:
+            return {'status': 'error', 'message': str(e)}, 504
+        except AnalysisError as e:
             return {'status': 'error', 'message': str(e)}, 500
+        except ValueError as e:
+            return {'status': 'error', 'message': f"Gemini returned invalid JSON: {e}"}, 502
+        return {'status': 'success', 'suggestions': suggestions}
 
 @api.route('/analyze')
 class AIAnalyzeOutput(Resource):
@@ -258,14 +263,12 @@ class AIAnalyzeOutput(Resource):
         api_key, command_output = data.get('apiKey'), data.get('output')
         if not api_key: return {'status': 'error', 'message': 'Gemini API Key is not configured.'}, 400
         if not command_output: return {'status': 'error', 'message': 'No output to analyze.'}, 400
+        # Re-analysing the same output (even with different timestamps) is answered from the cache.
         try:
-            prompt = "As an expert DevOps engineer, analyze..." # Your prompt here
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}"
-            response = requests.post(api_url, json={"contents": [{"parts": [{"text": prompt}]}]}, headers={'Content-Type': 'application/json'})
-            response.raise_for_status()
-            analysis = response.json()['candidates'][0]['content']['parts'][0]['text']
-            return {'status': 'success', 'analysis': analysis}
-        except Exception as e:
+            return {'status': 'success', 'analysis': analysis_service.analyze(load_config(), command_output, api_key)}
+        except AnalysisTimeout as e:
+            return {'status': 'error', 'message': str(e)}, 504
+        except AnalysisError as e:
             return {'status': 'error', 'message': str(e)}, 500
 
 # --- Hosts Namespace ---
@@ -273,8 +276,10 @@ class AIAnalyzeOutput(Resource):
 class HostListResource(Resource):
     def get(self):
         """Get all hosts for the current user's group."""
-        hosts = SSHHost.query.filter_by(group_id=current_user.group_id).all()
-        return [{'id': h.id, 'friendly_name': h.friendly_name, 'hostname': h.hostname, 'username': h.username} for h in hosts]
+        def build():
+            hosts = SSHHost.query.filter_by(group_id=current_user.group_id).order_by(SSHHost.friendly_name).all()
+            return [{'id': h.id, 'friendly_name': h.friendly_name, 'hostname': h.hostname, 'username': h.username} for h in hosts]
+        return conditional_get(current_user.group_id, build)
 
     def post(self):
         """Add a new host to the current user's group."""
@@ -316,21 +321,56 @@ class HostTestResource(Resource):
         host = db.session.get(SSHHost, host_id)
         if not host or host.group_id != current_user.group_id: return {'status': 'error', 'message': 'Host not found or access denied.'}, 404
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(host.hostname, username=host.username, timeout=10)
-            ssh.close()
+            # A test should prove the host is reachable now, so drop any cached transport first.
+            ssh_pool.invalidate(host.hostname, host.username)
+            ssh_pool.get_client(host.hostname, host.username)
             return {'status': 'success', 'message': 'Connection successful!'}
         except Exception as e:
             return {'status': 'error', 'message': f"Connection failed: {e}"}, 500
 
 # --- Scripts Namespace ---
+DEFAULT_SCRIPT_PAGE_SIZE = 200
+MAX_SCRIPT_PAGE_SIZE = 1000
+
+def _encode_script_cursor(script):
+    return base64.urlsafe_b64encode(json.dumps([script.name, script.id]).encode()).decode()
+
+def _decode_script_cursor(cursor):
+    name, script_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(name), int(script_id)
+
 @scripts_ns.route('/')
 class ScriptListResource(Resource):
     def get(self):
-        """Get all saved scripts for the current user's group."""
-        scripts = SavedScript.query.filter_by(group_id=current_user.group_id).all()
-        return [{'id': s.id, 'name': s.name, 'script_type': s.script_type, 'content': s.content} for s in scripts]
+        """
+        List the group's saved scripts by name, without their content.
+        `?q=` filters by name; `?limit=` sets the page size. When more scripts remain,
+        the X-Next-Cursor header holds the value to pass as `?cursor=` for the next page.
+        """
+        def build():
+            try:
+                limit = max(1, min(int(request.args.get('limit', DEFAULT_SCRIPT_PAGE_SIZE)), MAX_SCRIPT_PAGE_SIZE))
+            except ValueError:
+                limit = DEFAULT_SCRIPT_PAGE_SIZE
+            query = SavedScript.query.filter_by(group_id=current_user.group_id)
+            if request.args.get('q'):
+                query = query.filter(SavedScript.name.icontains(request.args['q'], autoescape=True))
+            cursor = request.args.get('cursor')
+            if cursor:
+                try:
+                    name, script_id = _decode_script_cursor(cursor)
+                except (ValueError, TypeError):
+                    return {'status': 'error', 'message': 'Invalid cursor.'}, 400
+                query = query.filter(or_(SavedScript.name > name, and_(SavedScript.name == name, SavedScript.id > script_id)))
+            # The (group_id, name) index serves the filter and the ordering; content is deferred and never read.
+            scripts = query.order_by(SavedScript.name, SavedScript.id).limit(limit + 1).all()
+            headers = {}
+            if len(scripts) > limit:
+                scripts = scripts[:limit]
+                headers['X-Next-Cursor'] = _encode_script_cursor(scripts[-1])
+            return [{'id': s.id, 'name': s.name, 'script_type': s.script_type, 'content_size': s.content_size, 'content_hash': s.content_hash}
+                    for s in scripts], 200, headers
+        return conditional_get(current_user.group_id, build)
 
     def post(self):
         """Save a new script."""
@@ -338,15 +378,19 @@ class ScriptListResource(Resource):
         new_script = SavedScript(name=data['name'], script_type=data['type'], content=data['content'], group_id=current_user.group_id)
         db.session.add(new_script)
         db.session.commit()
-        return {'status': 'success', 'message': 'Script saved!', 'script': {'id': new_script.id, 'name': new_script.name, 'script_type': new_script.script_type}}, 201
+        return {'status': 'success', 'message': 'Script saved!', 'script': {'id': new_script.id, 'name': new_script.name, 'script_type': new_script.script_type,
+                                                                           'content_size': new_script.content_size, 'content_hash': new_script.content_hash}}, 201
 
 @scripts_ns.route('/<int:script_id>')
 class ScriptResource(Resource):
     def get(self, script_id):
-        """Get a specific script's details."""
-        script = db.session.get(SavedScript, script_id)
-        if not script or script.group_id != current_user.group_id: return {'status': 'error', 'message': 'Script not found or access denied.'}, 404
-        return {'id': script.id, 'name': script.name, 'type': script.script_type, 'content': script.content}
+        """Get a specific script's details, including its content."""
+        def build():
+            script = db.session.get(SavedScript, script_id)
+            if not script or script.group_id != current_user.group_id: return {'status': 'error', 'message': 'Script not found or access denied.'}, 404
+            return {'id': script.id, 'name': script.name, 'type': script.script_type, 'content': script.content,
+                    'content_size': script.content_size, 'content_hash': script.content_hash}
+        return conditional_get(current_user.group_id, build)
 
     def put(self, script_id):
         """Update a saved script."""
@@ -365,7 +409,154 @@ class ScriptResource(Resource):
         db.session.commit()
         return {'status': 'success', 'message': 'Script deleted.'}
 
+# --- Schedules Namespace ---
+# The scheduler process picks up changes made here within SCHEDULE_SYNC_INTERVAL seconds.
+def schedule_to_dict(schedule, hosts_by_id=None):
+    """`hosts_by_id` ({id: SSHHost}) saves a query per schedule when listing many of them."""
+    if hosts_by_id is None:
+        hosts_by_id = {h.id: h for h in SSHHost.query.filter(SSHHost.id.in_(schedule.target_host_ids()))}
+    trigger_fields = {'trigger_type': schedule.trigger_type, 'hour': schedule.hour, 'minute': schedule.minute,
+                      'cron_expression': schedule.cron_expression, 'interval_seconds': schedule.interval_seconds, 'jitter_seconds': schedule.jitter_seconds}
+    if schedule.pipeline_id:
+        target = f"pipeline {schedule.pipeline.name}" if schedule.pipeline else "deleted pipeline"
+    else:
+        hosts = [hosts_by_id[i] for i in schedule.target_host_ids() if i in hosts_by_id]
+        target = f"{', '.join(h.friendly_name for h in hosts) or 'no hosts'} → {schedule.script.name if schedule.script else 'deleted script'}"
+    host = hosts_by_id.get(schedule.host_id)
+    return {'id': schedule.id, 'name': schedule.name, 'host_id': schedule.host_id, 'host_ids': schedule.target_host_ids(),
+            'script_id': schedule.script_id, 'pipeline_id': schedule.pipeline_id,
+            'host_name': host.friendly_name if host else None, 'script_name': schedule.script.name if schedule.script else None,
+            'target': target, 'when': describe_trigger(**trigger_fields), **trigger_fields}
+
+def _int_or_none(value, name='value'):
+    """int(value), or None for a missing value; raises ValueError naming the field when it isn't a number."""
+    if value in (None, ''): return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"{name} must be a whole number.")
+
+@schedules_ns.route('/')
+class ScheduleListResource(Resource):
+    def get(self):
+        """Get all schedules for the current user's group."""
+        schedules = (Schedule.query.filter_by(group_id=current_user.group_id)
+                     .options(selectinload(Schedule.script), selectinload(Schedule.pipeline)).order_by(Schedule.name).all())
+        host_ids = {host_id for s in schedules for host_id in s.target_host_ids()}
+        hosts_by_id = {h.id: h for h in SSHHost.query.filter(SSHHost.id.in_(host_ids))} if host_ids else {}
+        return [schedule_to_dict(s, hosts_by_id) for s in schedules]
+
+    def post(self):
+        """
+        Create a schedule, or update it when `schedule_id` is given. A schedule runs either
+        `pipeline_id`, or `script_id` on `host_id` / `host_ids`, with `trigger_type` 'daily'
+        (hour, minute), 'cron' (cron_expression) or 'interval' (interval_seconds), optionally
+        delayed by a random 0..jitter_seconds on every run.
+        """
+        data = request.json or {}
+        if not isinstance(data.get('name'), str) or not data['name'].strip():
+            return {'status': 'error', 'message': 'Schedule name is required.'}, 400
+        try:
+            trigger_fields = {'trigger_type': data.get('trigger_type') or 'daily', 'hour': _int_or_none(data.get('hour'), 'hour'), 'minute': _int_or_none(data.get('minute'), 'minute'),
+                              'cron_expression': str(data.get('cron_expression') or '').strip() or None, 'interval_seconds': _int_or_none(data.get('interval_seconds'), 'interval_seconds'),
+                              'jitter_seconds': _int_or_none(data.get('jitter_seconds'), 'jitter_seconds')}
+            build_trigger(**trigger_fields)
+            pipeline_id, script_id, schedule_id = (_int_or_none(data.get(key), key) for key in ('pipeline_id', 'script_id', 'schedule_id'))
+            if not isinstance(data.get('host_ids') or [], list):
+                raise TypeError("host_ids must be a list of host IDs.")
+            host_ids = (list(dict.fromkeys(_int_or_none(h, 'host_ids entry') for h in data.get('host_ids') or []))
+                        or ([_int_or_none(data['host_id'], 'host_id')] if data.get('host_id') else []))
+            if None in host_ids:
+                raise ValueError("host_ids entries must be whole numbers.")
+        except (ValueError, TypeError) as e:
+            return {'status': 'error', 'message': str(e)}, 400
+
+        if pipeline_id:
+            pipeline = db.session.get(Pipeline, pipeline_id)
+            if not pipeline or pipeline.group_id != current_user.group_id: return {'status': 'error', 'message': 'Pipeline not found or access denied.'}, 404
+            script_id, host_ids = None, []
+        else:
+            script = db.session.get(SavedScript, script_id) if script_id else None
+            hosts = SSHHost.query.filter(SSHHost.id.in_(host_ids), SSHHost.group_id == current_user.group_id).count() if host_ids else 0
+            if not script or script.group_id != current_user.group_id or not host_ids or hosts != len(host_ids):
+                return {'status': 'error', 'message': 'Host or script not found or access denied.'}, 404
+
+        if schedule_id:
+            schedule = db.session.get(Schedule, schedule_id)
+            if not schedule or schedule.group_id != current_user.group_id: return {'status': 'error', 'message': 'Schedule not found or access denied.'}, 404
+        else:
+            schedule = Schedule(group_id=current_user.group_id)
+            db.session.add(schedule)
+        schedule.name, schedule.pipeline_id, schedule.script_id = data['name'].strip(), pipeline_id, script_id
+        schedule.host_id = host_ids[0] if len(host_ids) == 1 else None
+        schedule.host_ids = json.dumps(host_ids) if len(host_ids) > 1 else None
+        for key, value in trigger_fields.items():
+            setattr(schedule, key, value)
+        db.session.commit()
+        return {'status': 'success', 'message': 'Schedule saved!', 'schedule': schedule_to_dict(schedule)}, 201
+
+@schedules_ns.route('/<int:schedule_id>')
+class ScheduleResource(Resource):
+    def delete(self, schedule_id):
+        """Delete a schedule."""
+        schedule = db.session.get(Schedule, schedule_id)
+        if not schedule or schedule.group_id != current_user.group_id: return {'status': 'error', 'message': 'Schedule not found or access denied.'}, 404
+        db.session.delete(schedule)
+        db.session.commit()
+        return {'status': 'success', 'message': 'Schedule deleted.'}
+
 # --- Run Namespace ---
+DEFAULT_RUN_MAX_PARALLEL = 10
+DEFAULT_RUN_HOST_TIMEOUT = 300
+
+def _execute_on_host(host, command, script_type, use_sudo, timeout, stream_settings):
+    """Runs a command or playbook against a single host and returns its result entry."""
+    started = time.monotonic()
+    config = load_config()
+    # Output beyond the head/tail caps is spilled to the output store and linked by output_id/error_id.
+    captures = output_captures(config, get_output_store(config), stream_settings.get('group_id'), host['friendly_name'])
+    try:
+        if script_type == 'ansible-playbook':
+            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.yml') as playbook_file:
+                playbook_file.write(command)
+                playbook_path = playbook_file.name
+            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.ini') as inventory_file:
+                inventory_file.write(f"[{host['friendly_name']}]\n{host['hostname']} ansible_user={host['username']}\n")
+                inventory_path = inventory_file.name
+            ansible_command = ['ansible-playbook', '-i', inventory_path, playbook_path]
+            if use_sudo: ansible_command.append('--become')
+            try:
+                process = subprocess.run(ansible_command, capture_output=True, text=True, timeout=timeout)
+            finally:
+                os.unlink(playbook_path)
+                os.unlink(inventory_path)
+            for stream, text in (('stdout', process.stdout), ('stderr', process.stderr)):
+                captures[stream].write(text)
+                captures[stream].close()
+            output, error = captures['stdout'].getvalue(), captures['stderr'].getvalue()
+            status = 'error' if process.returncode != 0 else 'success'
+        else:
+            exec_command = f"python3 -c {shlex.quote(command)}" if script_type == 'python-script' else command
+            if use_sudo: exec_command = f"sudo {exec_command}"
+            deadline = started + timeout if timeout else None
+            # Connecting and opening the channel count against the same deadline as the command itself.
+            _, stdout, _ = ssh_pool.exec_command(host['hostname'], host['username'], exec_command,
+                                                 timeout=max(deadline - time.monotonic(), 0.001) if deadline else None)
+            emitter = None
+            if stream_settings['socket_id']:
+                emitter = ChunkEmitter(
+                    lambda stream, data: socketio.emit('run_output', {'host_name': host['friendly_name'], 'stream': stream, 'data': data}, to=stream_settings['socket_id']),
+                    sleep=socketio.sleep, max_rate=stream_settings['max_rate'])
+            output, error, _ = stream_command(stdout, on_chunk=emitter, captures=captures, deadline=deadline)
+            status = 'error' if error else 'success'
+    except (subprocess.TimeoutExpired, socket.timeout):
+        output, error, status = '', f"Execution timed out after {timeout}s", 'error'
+    except Exception as e:
+        output, error, status = '', f"Execution failed: {e}", 'error'
+    return {'host_name': host['friendly_name'], 'status': status, 'output': output, 'error': error,
+            'output_id': captures['stdout'].output_id, 'error_id': captures['stderr'].output_id,
+            'duration': round(time.monotonic() - started, 3)}
+
 @run_ns.route('/')
 class ExecutionResource(Resource):
     def post(self):
@@ -374,46 +565,126 @@ class ExecutionResource(Resource):
         host_ids, command, script_type = data.get('host_ids', []), data.get('command', ''), data.get('type', 'bash-command')
         use_sudo = data.get('use_sudo', False)
         if not host_ids or not command: return {'status': 'error', 'message': 'Host and command required.'}, 400
-        
-        results = []
+        # `aggregate` groups hosts with identical results instead of returning one entry per host.
+        aggregate = 'exact' if data.get('aggregate') is True else data.get('aggregate') or None
+        if aggregate and aggregate not in AGGREGATE_MODES:
+            return {'status': 'error', 'message': f"aggregate must be true or one of {', '.join(AGGREGATE_MODES)}."}, 400
+
+        config = load_config()
+        try:
+            max_parallel = int(data.get('max_parallel') or config.get('RUN_MAX_PARALLEL', DEFAULT_RUN_MAX_PARALLEL))
+            timeout = float(data.get('timeout') or config.get('RUN_HOST_TIMEOUT', DEFAULT_RUN_HOST_TIMEOUT))
+        except (TypeError, ValueError):
+            return {'status': 'error', 'message': 'max_parallel and timeout must be numbers.'}, 400
+        if max_parallel < 1 or timeout <= 0:
+            return {'status': 'error', 'message': 'max_parallel and timeout must be positive.'}, 400
+
+        # When the browser sends its Socket.IO sid, output is streamed to it live as the hosts produce it.
+        # A sid the caller didn't open (on this process) is ignored, so output can't be sent to other sessions.
+        stream_settings = {
+            'socket_id': data.get('socket_id') if socket_of_current_user(data.get('socket_id')) else None,
+            'max_rate': int(config.get('STREAM_MAX_RATE', DEFAULT_MAX_RATE)),
+            # Spilled output is only served to this group.
+            'group_id': current_user.group_id,
+        }
+
         hosts = SSHHost.query.filter(SSHHost.id.in_(host_ids), SSHHost.group_id == current_user.group_id).all()
+        # Results come back in the order the hosts were requested, not the order the database returns them.
+        order = {str(host_id): index for index, host_id in reversed(list(enumerate(host_ids)))}
+        hosts.sort(key=lambda h: order.get(str(h.id), len(order)))
+        # Worker threads only see plain dicts, never ORM instances bound to this request's session.
+        targets = [{'id': h.id, 'friendly_name': h.friendly_name, 'hostname': h.hostname, 'username': h.username} for h in hosts]
+        if not targets:
+            return aggregate_results([], aggregate) if aggregate else {'results': []}
+
+        queue = get_job_queue(config)
+        if queue and data.get('async'):
+            job_id = queue.enqueue('run', {'targets': targets, 'command': command, 'script_type': script_type, 'use_sudo': use_sudo,
+                                           'timeout': timeout, 'max_parallel': max_parallel, 'stream_settings': stream_settings,
+                                           'aggregate': aggregate},
+                                   group_id=current_user.group_id, host_keys=[t['id'] for t in targets])
+            return {'status': 'queued', 'job_id': job_id}, 202
+
+        return execute_on_hosts(targets, command, script_type, use_sudo, timeout, max_parallel, stream_settings, aggregate)
+
+def iter_host_results(targets, command, script_type, use_sudo, timeout, max_parallel, stream_settings, ordered=True):
+    """
+    Fans a command out over the targets with bounded concurrency and yields the results, in host order
+    or, with `ordered` off, as hosts finish. Each future is dropped once its result has been yielded.
+    """
+    with ThreadPoolExecutor(max_workers=min(max_parallel, len(targets))) as executor:
+        if ordered:
+            futures = deque(executor.submit(_execute_on_host, host, command, script_type, use_sudo, timeout, stream_settings) for host in targets)
+            while futures:
+                yield futures.popleft().result()
+        else:
+            finished = SimpleQueue()
+            for host in targets:
+                executor.submit(_execute_on_host, host, command, script_type, use_sudo, timeout, stream_settings).add_done_callback(finished.put)
+            for _ in targets:
+                yield finished.get().result()
+
+def execute_on_hosts(targets, command, script_type, use_sudo, timeout, max_parallel, stream_settings, aggregate=None):
+    """The /api/run response body: one result per host, or the hosts grouped by result when `aggregate` is set."""
+    if aggregate:
+        # Folded in as hosts finish, so only one copy of each distinct output is held.
+        results = iter_host_results(targets, command, script_type, use_sudo, timeout, max_parallel, stream_settings, ordered=False)
+        return aggregate_results(results, aggregate, get_output_store(load_config()))
+    return {'results': list(iter_host_results(targets, command, script_type, use_sudo, timeout, max_parallel, stream_settings))}
+
+@run_ns.route('/pool')
+class SSHPoolStatsResource(Resource):
+    def get(self):
+        """Get SSH connection pool hit/miss counters."""
+        return ssh_pool.stats()
 
-        for host in hosts:
-            try:
-                if script_type == 'ansible-playbook':
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.yml') as playbook_file:
-                        playbook_file.write(command)
-                        playbook_path = playbook_file.name
-                    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.ini') as inventory_file:
-                        inventory_file.write(f"[{host.friendly_name}]\n{host.hostname} ansible_user={host.username}\n")
-                        inventory_path = inventory_file.name
-                    ansible_command = ['ansible-playbook', '-i', inventory_path, playbook_path]
-                    if use_sudo: ansible_command.append('--become')
-                    process = subprocess.run(ansible_command, capture_output=True, text=True)
-                    output, error = process.stdout, process.stderr
-                    os.unlink(playbook_path)
-                    os.unlink(inventory_path)
-                    results.append({'host_name': host.friendly_name, 'status': 'error' if process.returncode != 0 else 'success', 'output': output, 'error': error})
-                else:
-                    exec_command = f"python3 -c {shlex.quote(command)}" if script_type == 'python-script' else command
-                    if use_sudo: exec_command = f"sudo {exec_command}"
-                    ssh = paramiko.SSHClient()
-                    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                    ssh.connect(host.hostname, username=host.username, timeout=10)
-                    _, stdout, stderr = ssh.exec_command(exec_command)
-                    output, error = stdout.read().decode(), stderr.read().decode()
-                    results.append({'host_name': host.friendly_name, 'status': 'error' if error else 'success', 'output': output, 'error': error})
-                    ssh.close()
-            except Exception as e:
-                results.append({'host_name': host.friendly_name, 'status': 'error', 'output': '', 'error': f"Execution failed: {e}"})
-        
-        return {'results': results}
+# --- Jobs Namespace ---
+@jobs_ns.route('/')
+class JobListResource(Resource):
+    def get(self):
+        """List recent queued jobs for the current user's group, optionally filtered by ?status=."""
+        queue = get_job_queue(load_config())
+        if not queue: return []
+        return queue.list(group_id=current_user.group_id, status=request.args.get('status'), limit=min(request.args.get('limit', 50, type=int), 200))
+
+@jobs_ns.route('/<string:job_id>')
+class JobResource(Resource):
+    def get(self, job_id):
+        """Get the status and result of a queued job."""
+        queue = get_job_queue(load_config())
+        job = queue.get(job_id) if queue else None
+        if not job or job['group_id'] != current_user.group_id: return {'status': 'error', 'message': 'Job not found or access denied.'}, 404
+        return job
+
+# --- Outputs Namespace ---
+@outputs_ns.route('/<string:output_id>')
+class OutputResource(Resource):
+    def get(self, output_id):
+        """
+        Download the full output of a stream as UTF-8 text.
+        A single byte range (e.g. `Range: bytes=-65536` for the last 64 KiB) is answered with 206.
+        """
+        store = get_output_store(load_config())
+        meta = store.info(output_id) if store else None
+        if not meta or meta['group_id'] != current_user.group_id: return {'status': 'error', 'message': 'Output not found or access denied.'}, 404
+        size = meta['size']
+        # Stored outputs never change, so the id doubles as a strong validator.
+        headers = {'Accept-Ranges': 'bytes', 'ETag': f'"{output_id}"', 'Cache-Control': 'private, max-age=86400'}
+        start, stop, status = 0, size, 200
+        if request.range:
+            bounds = request.range.range_for_length(size) if request.range.units == 'bytes' else None
+            if bounds is None:
+                return Response(status=416, headers={'Content-Range': f"bytes */{size}"})
+            (start, stop), status = bounds, 206
+            headers['Content-Range'] = request.range.to_content_range_header(size)
+        headers['Content-Length'] = str(stop - start)
+        return Response(store.read(meta, start, stop), status=status, headers=headers, mimetype='text/plain')
 
 # --- First Run Setup ---
 def create_default_user_and_group():
     """Initializes the database with a default user and group if none exist."""
+    migrate_database(app)
     with app.app_context():
-        db.create_all()
         if Group.query.first() is None:
             default_group = Group(name='Default')
             db.session.add(default_group)
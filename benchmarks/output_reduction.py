@@ -0,0 +1,86 @@
+# benchmarks/output_reduction.py
+# Measures OutputReducer throughput and reduction on synthetic multi-MB logs:
+# access-log noise with timestamps, request ids and durations, periodic
+# warnings, a few distinct errors (some with tracebacks) repeated many times,
+# and some unique lines.
+#
+#   python benchmarks/output_reduction.py
+#   python benchmarks/output_reduction.py --sizes 1 5 --max-tokens 4000 --show
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output_reducer import OutputReducer, CHARS_PER_TOKEN
+
+CHUNK = 64 * 1024
+
+ERRORS = [
+    "ERROR database connection refused (host=db-{n}.internal port=5432)",
+    "Traceback (most recent call last):\n  File \"/srv/app/worker.py\", line {n}, in run\n    job.execute()\nTimeoutError: job {id} timed out after {n}s",
+    "CRITICAL disk /var/lib/docker is {n}% full",
+    "kernel: Out of memory: Killed process {n} (java)",
+]
+
+def make_log(size_mb, seed=1):
+    rng = random.Random(seed)
+    lines, size, t = [], 0, 1_760_000_000
+    while size < size_mb * 1024 * 1024:
+        t += rng.random()
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t)) + f".{rng.randint(0, 999):03d}Z"
+        roll = rng.random()
+        if roll < 0.0005:
+            line = f"{stamp} " + rng.choice(ERRORS).format(n=rng.randint(1, 99), id=uuid.UUID(int=rng.getrandbits(128)))
+        elif roll < 0.02:
+            line = f"{stamp} WARN slow query on table orders took {rng.randint(500, 9000)}ms"
+        elif roll < 0.03:
+            line = f"{stamp} INFO user {rng.randint(1, 10**6)} updated profile field {rng.choice(['email', 'name', 'avatar'])}"
+        elif roll < 0.035:
+            line = f"{stamp} DEBUG cache shard {rng.choice('abcdefgh')}{rng.randint(1, 4)} rebalanced"
+        else:
+            line = (f"{stamp} INFO GET /api/{rng.choice(['health', 'orders', 'users', 'items'])} {rng.choice([200, 200, 200, 304, 404])} "
+                    f"in {rng.randint(1, 120)}ms req={uuid.UUID(int=rng.getrandbits(128))}")
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines) + '\n'
+
+def run(text, max_tokens):
+    reducer = OutputReducer(max_tokens)
+    started = time.perf_counter()
+    for start in range(0, len(text), CHUNK):
+        reducer.feed(text[start:start + CHUNK])
+    result = reducer.result()
+    return reducer, result, time.perf_counter() - started
+
+def peak_memory(text, max_tokens):
+    tracemalloc.start()
+    run(text, max_tokens)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description='OutputReducer throughput on synthetic logs')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 50], help='log sizes in MB')
+    parser.add_argument('--max-tokens', type=int, default=8000)
+    parser.add_argument('--show', action='store_true', help='print the reduced output of the smallest log')
+    args = parser.parse_args()
+    print(f"{'input MB':>9}{'lines':>10}{'MB/s':>8}{'output chars':>14}{'~tokens':>9}{'ratio':>9}{'peak MB':>9}")
+    shown = None
+    for size_mb in args.sizes:
+        text = make_log(size_mb)
+        reducer, result, seconds = run(text, args.max_tokens)
+        peak = peak_memory(text, args.max_tokens)
+        print(f"{len(text) / 2**20:>9.1f}{reducer.lines:>10}{len(text) / 2**20 / seconds:>8.1f}{len(result):>14}"
+              f"{len(result) // CHARS_PER_TOKEN:>9}{len(text) / len(result):>8.0f}x{peak / 2**20:>9.1f}")
+        shown = shown or result
+    if args.show:
+        print('\n' + shown)
+
+if __name__ == '__main__':
+    main()
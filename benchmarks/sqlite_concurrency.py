@@ -0,0 +1,109 @@
+# benchmarks/sqlite_concurrency.py
+# Measures app.db throughput with the web app, the scheduler and the API
+# service hitting the same SQLite file at once, with stock SQLite settings
+# and with the shared settings from database.py.
+#
+#   python benchmarks/sqlite_concurrency.py --seconds 10
+#
+# Each role runs in its own process against a scratch copy of the schema:
+#   web       - mostly reads (host list, run history), some run inserts
+#   scheduler - revision polls, step result inserts and run status updates
+#   api       - reads only
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, insert, update, func
+from sqlalchemy.exc import OperationalError
+import database
+from models import db
+
+ROLES = ('web', 'scheduler', 'api')
+HOSTS = 200
+PIPELINES = 10
+
+def make_engine(uri, tuned):
+    # The shared settings, pragmas included, come with engine_options(); a bare engine gets SQLite's defaults.
+    return create_engine(uri, **database.engine_options(uri, {})) if tuned else create_engine(uri)
+
+def seed(uri, tuned):
+    engine = make_engine(uri, tuned)
+    db.metadata.create_all(engine)
+    tables = db.metadata.tables
+    with engine.begin() as conn:
+        conn.execute(insert(tables['group']), [{'id': 1, 'name': 'bench'}])
+        conn.execute(insert(tables['ssh_host']), [{'friendly_name': f"host-{i}", 'hostname': f"10.0.0.{i}", 'username': 'root', 'group_id': 1} for i in range(HOSTS)])
+        conn.execute(insert(tables['pipeline']), [{'name': f"pipeline-{i}", 'nodes': '[]', 'edges': '[]', 'group_id': 1} for i in range(PIPELINES)])
+        conn.execute(insert(tables['revision']), [{'scope': 'schedules', 'value': 0}])
+    engine.dispose()
+
+def run_role(role, uri, tuned, seconds, results):
+    engine = make_engine(uri, tuned)
+    tables = db.metadata.tables
+    hosts, runs, steps, revision = tables['ssh_host'], tables['pipeline_run'], tables['step_result'], tables['revision']
+    reads = writes = locked = 0
+    write_latencies = []
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        i += 1
+        try:
+            if role == 'api' or (role == 'web' and i % 5):
+                with engine.connect() as conn:
+                    conn.execute(select(hosts).where(hosts.c.group_id == 1)).fetchall()
+                    conn.execute(select(runs).where(runs.c.pipeline_id == i % PIPELINES + 1).order_by(runs.c.started_at.desc()).limit(50)).fetchall()
+                reads += 1
+            else:
+                started = time.monotonic()
+                with engine.begin() as conn:
+                    if role == 'web':
+                        conn.execute(insert(runs).values(pipeline_id=i % PIPELINES + 1, status='queued', dry_run=False, started_at=func.current_timestamp()))
+                    else:
+                        conn.execute(select(revision.c.value).where(revision.c.scope == 'schedules')).scalar()
+                        run_id = conn.execute(select(func.max(runs.c.id))).scalar()
+                        if run_id:
+                            conn.execute(insert(steps).values(run_id=run_id, node_name='step', node_type='script', status='success',
+                                                              started_at=func.current_timestamp(), output='x' * 2048, output_size=2048, output_truncated=False))
+                            conn.execute(update(runs).where(runs.c.id == run_id).values(status='running'))
+                write_latencies.append(time.monotonic() - started)
+                writes += 1
+        except OperationalError as e:
+            if 'locked' not in str(e): raise
+            locked += 1
+    engine.dispose()
+    write_latencies.sort()
+    p95 = write_latencies[min(len(write_latencies) - 1, int(len(write_latencies) * 0.95))] if write_latencies else 0
+    results.put((role, reads / seconds, writes / seconds, locked, p95 * 1000))
+
+def run_mode(tuned, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        seed(uri, tuned)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_role, args=(role, uri, tuned, seconds, results)) for role in ROLES]
+        for p in processes: p.start()
+        rows = [results.get() for _ in processes]
+        for p in processes: p.join()
+    return sorted(rows, key=lambda row: ROLES.index(row[0]))
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite concurrency benchmark for app.db')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mode', choices=['default', 'tuned', 'both'], default='both')
+    args = parser.parse_args()
+    modes = {'default': [False], 'tuned': [True], 'both': [False, True]}[args.mode]
+    print(f"{'settings':<10}{'process':<11}{'reads/s':>10}{'writes/s':>10}{'locked':>8}{'p95 write ms':>14}")
+    for tuned in modes:
+        rows = run_mode(tuned, args.seconds)
+        for role, reads, writes, locked, p95 in rows:
+            print(f"{'tuned' if tuned else 'default':<10}{role:<11}{reads:>10.0f}{writes:>10.0f}{locked:>8}{p95:>14.1f}")
+        total_reads, total_writes = sum(r[1] for r in rows), sum(r[2] for r in rows)
+        print(f"{'':<10}{'total':<11}{total_reads:>10.0f}{total_writes:>10.0f}{sum(r[3] for r in rows):>8}")
+
+if __name__ == '__main__':
+    main()
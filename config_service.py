@@ -0,0 +1,78 @@
+# config_service.py
+import json
+import os
+import tempfile
+import threading
+
+# --- Config Service ---
+# config.json is read by the web app, the pipeline runner, the GitHub routes
+# and the scheduler, often several times per request or task. The parsed
+# document is cached and reused until the file's mtime, inode or size changes.
+# Saves write a temporary file and rename it over config.json, so a reader in
+# any process sees either the old or the new file, never a partial one.
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+CONFIG_FILE = os.path.join(basedir, 'config.json')
+
+class ConfigService:
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._data = {}
+
+    @staticmethod
+    def _stamp_of(stat):
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def load(self):
+        """Returns a copy of the parsed config, re-reading the file only if it changed."""
+        try:
+            stamp = self._stamp_of(os.stat(self.path))
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if stamp == self._stamp:
+                return dict(self._data)
+        with open(self.path, 'r') as f:
+            # Stat the handle we actually read, so a rename racing with us can't pair new content with an old stamp.
+            stamp = self._stamp_of(os.fstat(f.fileno()))
+            data = json.load(f)
+        with self._lock:
+            self._stamp, self._data = stamp, data
+        return dict(data)
+
+    def save(self, config_data):
+        """Atomically replaces config.json with `config_data`."""
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=directory)
+        try:
+            # mkstemp creates the file as 0600; keep whatever mode config.json already had.
+            try:
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+            with os.fdopen(fd, 'w') as f:
+                json.dump(config_data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            self._stamp, self._data = self._stamp_of(os.stat(self.path)), dict(config_data)
+
+# Shared instance; every module reads config.json through these helpers.
+config_service = ConfigService()
+
+def load_config():
+    """Loads the main configuration file."""
+    return config_service.load()
+
+def save_config(config_data):
+    """Saves data to the main configuration file."""
+    config_service.save(config_data)
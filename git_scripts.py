@@ -1,13 +1,13 @@
 # git_scripts.py
 from flask import Blueprint, request, jsonify
 from github import Github, UnknownObjectException
+from github_cache import github_cache, GitHubNotFound
+from config_service import load_config
 import json
 import os
 
 # --- Blueprint Setup ---
 # This blueprint will be registered with the main Flask app.
-# The `load_config` function will be attached to this blueprint from app.py
-# to avoid circular import issues.
 git_bp = Blueprint('git_bp', __name__)
 
 # --- Helper Functions ---
@@ -30,37 +30,31 @@ def _get_repo(g, config):
 @git_bp.route('/api/github/scripts', methods=['GET'])
 def get_github_scripts():
     """
-    Fetches scripts from predefined directories in the GitHub repository.
+    Fetches scripts from predefined directories (and their subfolders) in the GitHub repository.
     """
-    config = git_bp.load_config()
+    config = load_config()
     
     # Gracefully handle missing configuration to prevent server errors on page load.
     if not config.get('GITHUB_PAT') or not config.get('GITHUB_REPO'):
         return jsonify([])
 
     try:
-        g = _get_github_instance(config)
-        repo = _get_repo(g, config)
-        
-        # Define the directories to scan for scripts.
+        # Define the directories to scan for scripts, including any subfolders.
         script_dirs = ['bash_scripts', 'python_scripts', 'ansible_playbooks', 'pipelines']
         all_scripts = []
 
-        for directory in script_dirs:
-            try:
-                contents = repo.get_contents(directory)
-                for content_file in contents:
-                    if content_file.type == 'file':
-                        all_scripts.append({
-                            'name': content_file.name,
-                            'path': content_file.path,
-                            'type': directory, # Store the directory as the type
-                            'sha': content_file.sha
-                        })
-            except UnknownObjectException:
-                # This is normal if a directory doesn't exist, so we just skip it.
-                print(f"Info: Directory '{directory}' not found in repo, skipping.")
-                continue
+        # One recursive tree fetch lists the whole repo; it is cached by tree SHA and
+        # only revalidated with GitHub after the TTL.
+        tree = github_cache.get_tree(config)
+        for path, sha in sorted(tree.items()):
+            directory = path.split('/', 1)[0]
+            if directory in script_dirs and '/' in path:
+                all_scripts.append({
+                    'name': path.split('/', 1)[1], # Path inside the directory, e.g. 'db/backup.sh'
+                    'path': path,
+                    'type': directory, # Store the top-level directory as the type
+                    'sha': sha
+                })
 
         return jsonify(all_scripts)
     except Exception as e:
@@ -70,23 +64,22 @@ def get_github_scripts():
 @git_bp.route('/api/github/script-content', methods=['GET'])
 def get_script_content():
     """Fetches the content of a single script from GitHub using its path."""
-    config = git_bp.load_config()
+    config = load_config()
     path = request.args.get('path')
     if not path:
         return jsonify({'status': 'error', 'message': 'Path parameter is required.'}), 400
     try:
-        g = _get_github_instance(config)
-        repo = _get_repo(g, config)
-        file_content = repo.get_contents(path)
-        # Decode the content from base64 to a UTF-8 string.
-        return jsonify({'content': file_content.decoded_content.decode('utf-8')})
+        # File bodies are cached by blob SHA, so unchanged scripts are never downloaded twice.
+        return jsonify({'content': github_cache.get_file(config, path)})
+    except GitHubNotFound:
+        return jsonify({'status': 'error', 'message': f"Script '{path}' not found in repository."}), 404
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @git_bp.route('/api/github/push-script', methods=['POST'])
 def push_script_to_github():
     """Pushes a local script to the correct subdirectory in the dev branch."""
-    config = git_bp.load_config()
+    config = load_config()
     data = request.json
     
     filename = data.get('filename')
@@ -135,7 +128,7 @@ def push_script_to_github():
 @git_bp.route('/api/github/push-pipeline', methods=['POST'])
 def push_pipeline_to_github():
     """Pushes a pipeline YAML file to the dev branch."""
-    config = git_bp.load_config()
+    config = load_config()
     data = request.json
     
     pipeline_name = data.get('name')
@@ -0,0 +1,240 @@
+# github_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+
+# --- GitHub Read Cache ---
+# Script listings and file bodies are read through this cache instead of
+# PyGithub. The whole repository is listed with one recursive git tree fetch
+# at the branch head; the parsed tree is stored by tree SHA, and the
+# branch -> tree lookup is reused for GITHUB_CACHE_TTL seconds and then
+# revalidated with If-None-Match. GitHub answers unchanged trees with 304,
+# which does not count against the rate limit. File bodies are stored on disk
+# by blob SHA, so a given version of a script is downloaded once.
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_CACHE_DIR = os.path.join(basedir, '.cache', 'github')
+DEFAULT_TTL = 300
+DEFAULT_BRANCH_TTL = 24 * 3600
+# Blobs and trees not read for this long are deleted; they are downloaded again if needed.
+DEFAULT_RETENTION_DAYS = 30
+PRUNE_INTERVAL = 3600
+API_ROOT = 'https://api.github.com'
+
+class GitHubNotFound(Exception):
+    pass
+
+class GitHubCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/vnd.github+json', 'X-GitHub-Api-Version': '2022-11-28'})
+        self._listings = {}
+        self._trees = {}
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._last_prune = 0
+        self.api_calls = 0
+
+    # --- HTTP ---
+    def _get(self, url, config, etag=None, accept=None):
+        headers = {'Authorization': f"Bearer {config['GITHUB_PAT']}"} if config.get('GITHUB_PAT') else {}
+        if etag: headers['If-None-Match'] = etag
+        if accept: headers['Accept'] = accept
+        with self._lock:
+            self.api_calls += 1
+        response = self.session.get(url, headers=headers, timeout=30)
+        if response.status_code == 404:
+            raise GitHubNotFound(url)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _repo(config):
+        repo = config.get('GITHUB_REPO')
+        if not repo:
+            raise Exception("GitHub repository not configured in settings.")
+        return repo
+
+    # --- Listings ---
+    def _listing_path(self, key):
+        return os.path.join(self.cache_dir, 'listings', hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def _load_listing(self, key):
+        with self._lock:
+            entry = self._listings.get(key)
+        if entry: return entry
+        try:
+            with open(self._listing_path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._listings[key] = entry
+        return entry
+
+    def _store_listing(self, key, entry):
+        with self._lock:
+            self._listings[key] = entry
+        self._write_atomic(self._listing_path(key), json.dumps(entry).encode())
+
+    def _forget_listing(self, key):
+        with self._lock:
+            self._listings.pop(key, None)
+        try:
+            os.remove(self._listing_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _cached_json(self, key, url, config, transform=lambda data: data, ttl=None):
+        """
+        Returns transform(JSON body of `url`), served from cache within the TTL
+        and revalidated by ETag after it. Returns None if the URL doesn't exist.
+        """
+        ttl = float(config.get('GITHUB_CACHE_TTL', DEFAULT_TTL)) if ttl is None else ttl
+        entry = self._load_listing(key)
+        if entry and time.time() - entry['fetched_at'] < ttl:
+            return entry['data']
+        try:
+            response = self._get(url, config, etag=entry.get('etag') if entry else None)
+        except GitHubNotFound:
+            entry = {'etag': None, 'fetched_at': time.time(), 'data': None}
+            self._store_listing(key, entry)
+            return None
+        if response.status_code == 304 and entry:
+            entry['fetched_at'] = time.time()
+        else:
+            entry = {'etag': response.headers.get('ETag'), 'fetched_at': time.time(), 'data': transform(response.json())}
+        self._store_listing(key, entry)
+        return entry['data']
+
+    def _branch(self, config):
+        branch = config.get('GITHUB_BRANCH')
+        if branch: return branch
+        repo = self._repo(config)
+        # A repository's default branch practically never changes, so it is only rechecked daily.
+        info = self._cached_json(f"repo:{repo}", f"{API_ROOT}/repos/{repo}", config,
+                                 lambda data: {'default_branch': data['default_branch']}, ttl=DEFAULT_BRANCH_TTL)
+        if info is None:
+            raise GitHubNotFound(repo)
+        return info['default_branch']
+
+    def get_tree(self, config, ref=None):
+        """
+        Returns {path: blob sha} for every file in the repository at the head of `ref`
+        (default: GITHUB_BRANCH or the repository's default branch), using a single
+        recursive tree request.
+        """
+        repo = self._repo(config)
+        ref = ref or self._branch(config)
+        key = f"tree:{repo}:{ref}"
+        tree_sha = self._cached_json(key, f"{API_ROOT}/repos/{repo}/git/trees/{ref}?recursive=1", config, self._store_tree)
+        if tree_sha is None:
+            raise GitHubNotFound(f"{repo}@{ref}")
+        try:
+            return self._load_tree(tree_sha)
+        except (OSError, ValueError):
+            # The tree file was removed from the cache directory; forget the ETag and fetch it again.
+            self._forget_listing(key)
+            return self._load_tree(self._cached_json(key, f"{API_ROOT}/repos/{repo}/git/trees/{ref}?recursive=1", config, self._store_tree))
+
+    def _tree_path(self, tree_sha):
+        return os.path.join(self.cache_dir, 'trees', f"{tree_sha}.json")
+
+    def _store_tree(self, data):
+        """Persists a tree response by its SHA and returns the SHA; trees are immutable, so this never expires."""
+        if data.get('truncated'):
+            print(f"Warning: GitHub truncated the tree listing for {data['sha']}; some scripts may be missing.")
+        blobs = {item['path']: item['sha'] for item in data.get('tree', []) if item.get('type') == 'blob'}
+        with self._lock:
+            self._trees[data['sha']] = blobs
+        self._write_atomic(self._tree_path(data['sha']), json.dumps(blobs).encode())
+        return data['sha']
+
+    def _load_tree(self, tree_sha):
+        with self._lock:
+            blobs = self._trees.get(tree_sha)
+        if blobs is not None: return blobs
+        with open(self._tree_path(tree_sha), 'r') as f:
+            blobs = json.load(f)
+        with self._lock:
+            self._trees[tree_sha] = blobs
+        return blobs
+
+    # --- Blobs ---
+    def _blob_path(self, sha):
+        return os.path.join(self.cache_dir, 'blobs', sha[:2], sha)
+
+    def get_blob(self, config, sha):
+        """Returns the decoded content of a blob, downloading it only if this SHA isn't cached yet."""
+        blob_path = self._blob_path(sha)
+        try:
+            with open(blob_path, 'rb') as f:
+                content = f.read().decode('utf-8')
+            # Bump the mtime so prune() only drops blobs nobody has read for a while.
+            os.utime(blob_path)
+            return content
+        except FileNotFoundError:
+            pass
+        repo = self._repo(config)
+        response = self._get(f"{API_ROOT}/repos/{repo}/git/blobs/{sha}", config, accept='application/vnd.github.raw')
+        self._write_atomic(blob_path, response.content)
+        self.prune(config)
+        return response.content.decode('utf-8')
+
+    def get_file(self, config, path, ref=None):
+        """Returns the current content of a file, resolved to its blob SHA via the cached tree."""
+        sha = self.get_tree(config, ref=ref).get(path)
+        if not sha:
+            raise GitHubNotFound(path)
+        return self.get_blob(config, sha)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def prune(self, config):
+        """Deletes cached blobs and trees older than GITHUB_CACHE_RETENTION_DAYS; runs at most every PRUNE_INTERVAL seconds."""
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL or not self._prune_lock.acquire(blocking=False): return
+        try:
+            self._last_prune = now
+            cutoff = now - float(config.get('GITHUB_CACHE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)) * 86400
+            pruned_trees = set()
+            for root, _, files in os.walk(os.path.join(self.cache_dir, 'blobs')):
+                self._prune_files(root, files, cutoff)
+            for root, _, files in os.walk(os.path.join(self.cache_dir, 'trees')):
+                pruned_trees.update(name[:-len('.json')] for name in self._prune_files(root, files, cutoff))
+            with self._lock:
+                for tree_sha in pruned_trees:
+                    self._trees.pop(tree_sha, None)
+        finally:
+            self._prune_lock.release()
+
+    @staticmethod
+    def _prune_files(root, files, cutoff):
+        removed = []
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed.append(name)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'api_calls': self.api_calls}
+
+# Shared instance used by the GitHub routes and the pipeline runner.
+github_cache = GitHubCache()
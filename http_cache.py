@@ -0,0 +1,39 @@
+# http_cache.py
+import hashlib
+from flask import request, make_response
+from models import get_revision, group_scope
+
+# --- Conditional GET ---
+# Hosts, scripts and pipelines bump their group's revision counter
+# ('group:<id>', see models.REVISION_SCOPES) whenever they change. A listing's
+# ETag is derived from the group, that counter and the request path including
+# the query string, so it changes whenever the response could. Browsers revalidate
+# with If-None-Match on every fetch (Cache-Control: no-cache) and get an
+# empty 304 while nothing in the group has changed.
+
+CACHE_CONTROL = 'private, no-cache'
+
+def group_etag(group_id):
+    revision = get_revision(group_scope(group_id))
+    # The group is part of the tag: two groups can be at the same revision, and a browser may be shared.
+    return hashlib.sha256(f"{group_id}:{revision}:{request.full_path}".encode()).hexdigest()[:32]
+
+def conditional_get(group_id, build):
+    """
+    Answers a GET for data owned by `group_id`. Returns an empty 304 if the
+    client's If-None-Match matches, otherwise the result of `build()`: a body,
+    or a (body, status, headers) tuple as returned by a Resource, with ETag
+    and Cache-Control headers added.
+    """
+    # Read the revision before building the body: a change landing in between
+    # then yields a newer body under an older tag, which is merely refetched.
+    etag = group_etag(group_id)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': CACHE_CONTROL}
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.headers.update(headers)
+        return response
+    result = build()
+    body, status, extra = (result + ({},))[:3] if isinstance(result, tuple) else (result, 200, {})
+    if status != 200: return result
+    return body, status, {**extra, **headers}
@@ -0,0 +1,220 @@
+# job_queue.py
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# --- Job Queue ---
+# Pipeline runs and ad-hoc executions can be handed to separate worker
+# processes (see worker.py) instead of running inside the web process.
+# The backend is chosen with JOB_QUEUE_BACKEND in config.json:
+#   'inline' (default) - no queue, work runs in the web process as before
+#   'sqlite'           - durable local queue in jobs.db, consumed by worker.py
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_QUEUE_PATH = os.path.join(basedir, 'jobs.db')
+DEFAULT_MAX_PER_GROUP = 4
+DEFAULT_MAX_PER_HOST = 2
+DEFAULT_LEASE_SECONDS = 60
+# A job whose lease expired this many times (its worker keeps dying on it) is failed instead of handed out again.
+DEFAULT_MAX_ATTEMPTS = 3
+
+class JobQueue(abc.ABC):
+    """Interface every queue backend implements."""
+
+    @abc.abstractmethod
+    def enqueue(self, kind, payload, group_id=None, host_keys=()):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, worker_id, max_per_group=DEFAULT_MAX_PER_GROUP, max_per_host=DEFAULT_MAX_PER_HOST,
+              max_attempts=DEFAULT_MAX_ATTEMPTS):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id, worker_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, job_id, worker_id, result=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, job_id, worker_id, error):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, job_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list(self, group_id=None, status=None, limit=50):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stats(self):
+        raise NotImplementedError
+
+class SQLiteJobQueue(JobQueue):
+    """
+    A durable queue in a standalone SQLite file. Claims happen inside
+    BEGIN IMMEDIATE transactions, so any number of worker processes can
+    consume it without handing the same job out twice. Running jobs hold a
+    lease that workers renew; jobs whose lease expires (e.g. the worker was
+    killed) are handed out again.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._conn().executescript("""
+                CREATE TABLE IF NOT EXISTS job (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    group_id INTEGER,
+                    status TEXT NOT NULL,
+                    worker_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS job_host (
+                    job_id TEXT NOT NULL REFERENCES job(id) ON DELETE CASCADE,
+                    host_key TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_job_status_created ON job (status, created_at);
+                CREATE INDEX IF NOT EXISTS ix_job_group_created ON job (group_id, created_at);
+                CREATE INDEX IF NOT EXISTS ix_job_host_job ON job_host (job_id);
+            """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def _connect(self):
+        return _Transaction(self._conn())
+
+    def enqueue(self, kind, payload, group_id=None, host_keys=()):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("INSERT INTO job (id, kind, payload, group_id, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                         (job_id, kind, json.dumps(payload), group_id, time.time()))
+            conn.executemany("INSERT INTO job_host (job_id, host_key) VALUES (?, ?)", [(job_id, str(k)) for k in set(host_keys)])
+        return job_id
+
+    def claim(self, worker_id, max_per_group=DEFAULT_MAX_PER_GROUP, max_per_host=DEFAULT_MAX_PER_HOST,
+              max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Atomically takes the oldest queued job whose group and hosts are under their concurrency limits.
+        Jobs with an expired lease are queued again, or failed once they have been tried max_attempts times.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            if max_attempts:
+                conn.execute("UPDATE job SET status = 'failed', worker_id = NULL, finished_at = ?, lease_expires_at = NULL, "
+                             "error = 'Lease expired on each of ' || attempts || ' attempts; the worker running it stopped responding.' "
+                             "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?", (now, now, max_attempts))
+            conn.execute("UPDATE job SET status = 'queued', worker_id = NULL WHERE status = 'running' AND lease_expires_at < ?", (now,))
+            group_load = {row['group_id']: row['n'] for row in conn.execute(
+                "SELECT group_id, COUNT(*) AS n FROM job WHERE status = 'running' GROUP BY group_id")}
+            host_load = {row['host_key']: row['n'] for row in conn.execute(
+                "SELECT h.host_key, COUNT(*) AS n FROM job_host h JOIN job j ON j.id = h.job_id WHERE j.status = 'running' GROUP BY h.host_key")}
+            candidates = conn.execute("SELECT id, group_id FROM job WHERE status = 'queued' ORDER BY created_at LIMIT 200").fetchall()
+            for candidate in candidates:
+                if max_per_group and candidate['group_id'] is not None and group_load.get(candidate['group_id'], 0) >= max_per_group:
+                    continue
+                hosts = [row['host_key'] for row in conn.execute("SELECT host_key FROM job_host WHERE job_id = ?", (candidate['id'],))]
+                if max_per_host and any(host_load.get(h, 0) >= max_per_host for h in hosts):
+                    continue
+                conn.execute("UPDATE job SET status = 'running', worker_id = ?, attempts = attempts + 1, started_at = ?, lease_expires_at = ? WHERE id = ?",
+                             (worker_id, now, now + self.lease_seconds, candidate['id']))
+                return self._row_to_job(conn.execute("SELECT * FROM job WHERE id = ?", (candidate['id'],)).fetchone())
+        return None
+
+    def heartbeat(self, job_id, worker_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE job SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                         (time.time() + self.lease_seconds, job_id, worker_id))
+
+    def complete(self, job_id, worker_id, result=None):
+        return self._finish(job_id, worker_id, 'success', result=json.dumps(result) if result is not None else None)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, 'failed', error=str(error))
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        """Records the outcome; returns False if the worker no longer holds the job (its lease expired and it was handed out again)."""
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE job SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                                  "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                                  (status, result, error, time.time(), job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM job WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, group_id=None, status=None, limit=50):
+        clauses, params = [], []
+        if group_id is not None:
+            clauses.append("group_id = ?"); params.append(group_id)
+        if status:
+            clauses.append("status = ?"); params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._conn().execute(f"SELECT * FROM job {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._row_to_job(row, include_result=False) for row in rows]
+
+    def stats(self):
+        return {row['status']: row['n'] for row in self._conn().execute("SELECT status, COUNT(*) AS n FROM job GROUP BY status")}
+
+    @staticmethod
+    def _row_to_job(row, include_result=True):
+        job = {key: row[key] for key in ('id', 'kind', 'group_id', 'status', 'worker_id', 'attempts', 'error', 'created_at', 'started_at', 'finished_at')}
+        job['payload'] = json.loads(row['payload'])
+        if include_result:
+            job['result'] = json.loads(row['result']) if row['result'] else None
+        return job
+
+class _Transaction:
+    """Wraps an autocommit connection in BEGIN IMMEDIATE ... COMMIT/ROLLBACK."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_job_queue(config):
+    """Returns the configured queue backend, or None when jobs run inline."""
+    backend = config.get('JOB_QUEUE_BACKEND', 'inline')
+    if backend == 'inline':
+        return None
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown JOB_QUEUE_BACKEND '{backend}'.")
+    path = config.get('JOB_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+    with _queues_lock:
+        if path not in _queues:
+            _queues[path] = SQLiteJobQueue(path)
+        return _queues[path]
@@ -0,0 +1,85 @@
+"""Baseline schema, as created by db.create_all() before migrations existed
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=100), nullable=False),
+        sa.Column('password', sa.String(length=100), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('ssh_host',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('friendly_name', sa.String(length=100), nullable=False),
+        sa.Column('hostname', sa.String(length=100), nullable=False),
+        sa.Column('username', sa.String(length=100), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('friendly_name', 'group_id', name='_friendly_name_group_uc')
+    )
+    op.create_table('saved_script',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('script_type', sa.String(length=50), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name', 'group_id', name='_script_name_group_uc')
+    )
+    op.create_table('pipeline',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('nodes', sa.Text(), nullable=False),
+        sa.Column('edges', sa.Text(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name', 'group_id', name='_pipeline_name_group_uc')
+    )
+    op.create_table('schedule',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('host_id', sa.Integer(), nullable=False),
+        sa.Column('script_id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.Integer(), nullable=False),
+        sa.Column('minute', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['host_id'], ['ssh_host.id']),
+        sa.ForeignKeyConstraint(['script_id'], ['saved_script.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('schedule')
+    op.drop_table('pipeline')
+    op.drop_table('saved_script')
+    op.drop_table('ssh_host')
+    op.drop_table('user')
+    op.drop_table('group')
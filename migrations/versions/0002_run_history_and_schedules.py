@@ -0,0 +1,109 @@
+"""Pipeline run history, change counters, leases, flexible schedules
+
+Revision ID: 0002_run_history_and_schedules
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_run_history_and_schedules'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+# Databases stamped at the baseline may already contain some of these tables
+# and columns (db.create_all() and the old upgrade_schema() created them), so
+# every step checks what exists first.
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    tables = _tables()
+    if 'pipeline_run' not in tables:
+        op.create_table('pipeline_run',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('pipeline_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('dry_run', sa.Boolean(), nullable=False),
+            sa.Column('triggered_by', sa.String(length=100), nullable=True),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['pipeline_id'], ['pipeline.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_pipeline_run_pipeline_started', 'pipeline_run', ['pipeline_id', 'started_at', 'id'])
+    if 'step_result' not in tables:
+        op.create_table('step_result',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('run_id', sa.Integer(), nullable=False),
+            sa.Column('node_id', sa.Integer(), nullable=True),
+            sa.Column('node_name', sa.String(length=100), nullable=False),
+            sa.Column('node_type', sa.String(length=50), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=False),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('output', sa.Text(), nullable=True),
+            sa.Column('output_size', sa.Integer(), nullable=False),
+            sa.Column('output_truncated', sa.Boolean(), nullable=False),
+            sa.ForeignKeyConstraint(['run_id'], ['pipeline_run.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_step_result_run', 'step_result', ['run_id', 'id'])
+    if 'revision' not in tables:
+        op.create_table('revision',
+            sa.Column('scope', sa.String(length=64), nullable=False),
+            sa.Column('value', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('scope')
+        )
+    if 'lease' not in tables:
+        op.create_table('lease',
+            sa.Column('name', sa.String(length=64), nullable=False),
+            sa.Column('holder', sa.String(length=200), nullable=False),
+            sa.Column('expires_at', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('name')
+        )
+
+    columns = _columns('schedule')
+    if 'trigger_type' not in columns:
+        # Schedules may now target a pipeline or a host set and use cron/interval triggers,
+        # so the old single host/script/time columns become optional.
+        with op.batch_alter_table('schedule') as batch_op:
+            batch_op.add_column(sa.Column('group_id', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('host_ids', sa.Text(), nullable=True))
+            batch_op.add_column(sa.Column('pipeline_id', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('trigger_type', sa.String(length=20), nullable=False, server_default='daily'))
+            batch_op.add_column(sa.Column('cron_expression', sa.String(length=100), nullable=True))
+            batch_op.add_column(sa.Column('interval_seconds', sa.Integer(), nullable=True))
+            batch_op.alter_column('host_id', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column('script_id', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column('hour', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column('minute', existing_type=sa.Integer(), nullable=True)
+            batch_op.create_foreign_key('fk_schedule_group_id_group', 'group', ['group_id'], ['id'])
+            batch_op.create_foreign_key('fk_schedule_pipeline_id_pipeline', 'pipeline', ['pipeline_id'], ['id'])
+        op.execute("UPDATE schedule SET group_id = (SELECT ssh_host.group_id FROM ssh_host WHERE ssh_host.id = schedule.host_id)")
+    if 'jitter_seconds' not in _columns('schedule'):
+        with op.batch_alter_table('schedule') as batch_op:
+            batch_op.add_column(sa.Column('jitter_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('schedule') as batch_op:
+        batch_op.drop_constraint('fk_schedule_pipeline_id_pipeline', type_='foreignkey')
+        batch_op.drop_constraint('fk_schedule_group_id_group', type_='foreignkey')
+        for column in ('jitter_seconds', 'interval_seconds', 'cron_expression', 'trigger_type', 'pipeline_id', 'host_ids', 'group_id'):
+            batch_op.drop_column(column)
+    op.drop_table('lease')
+    op.drop_table('revision')
+    op.drop_index('ix_step_result_run', table_name='step_result')
+    op.drop_table('step_result')
+    op.drop_index('ix_pipeline_run_pipeline_started', table_name='pipeline_run')
+    op.drop_table('pipeline_run')
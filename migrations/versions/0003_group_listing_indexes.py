@@ -0,0 +1,35 @@
+"""Indexes for per-group listings and schedule lookups
+
+Revision ID: 0003_group_listing_indexes
+Revises: 0002_run_history_and_schedules
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_group_listing_indexes'
+down_revision = '0002_run_history_and_schedules'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_ssh_host_group_name', 'ssh_host', ['group_id', 'friendly_name']),
+    ('ix_saved_script_group_name', 'saved_script', ['group_id', 'name']),
+    ('ix_pipeline_group_name', 'pipeline', ['group_id', 'name']),
+    ('ix_schedule_group_name', 'schedule', ['group_id', 'name']),
+    ('ix_schedule_host_id', 'schedule', ['host_id']),
+    ('ix_schedule_script_id', 'schedule', ['script_id']),
+    ('ix_schedule_pipeline_id', 'schedule', ['pipeline_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,47 @@
+"""Content size and hash on saved scripts
+
+Revision ID: 0004_script_content_summary
+Revises: 0003_group_listing_indexes
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_script_content_summary'
+down_revision = '0003_group_listing_indexes'
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+
+def upgrade():
+    with op.batch_alter_table('saved_script') as batch_op:
+        batch_op.add_column(sa.Column('content_size', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+    # Same values as models.content_digest(), computed here so the migration doesn't depend on the models.
+    conn = op.get_bind()
+    script = sa.table('saved_script', sa.column('id', sa.Integer), sa.column('content', sa.Text),
+                      sa.column('content_size', sa.Integer), sa.column('content_hash', sa.String))
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select(script.c.id, script.c.content).where(script.c.id > last_id)
+                            .order_by(script.c.id).limit(BATCH)).all()
+        if not rows: break
+        for script_id, content in rows:
+            data = (content or '').encode('utf-8')
+            conn.execute(script.update().where(script.c.id == script_id)
+                         .values(content_size=len(data), content_hash=hashlib.sha256(data).hexdigest()))
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('saved_script') as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('content_size')
@@ -0,0 +1,26 @@
+"""Link step results to spilled output
+
+Revision ID: 0005_step_output_id
+Revises: 0004_script_content_summary
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_step_output_id'
+down_revision = '0004_script_content_summary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('step_result') as batch_op:
+        batch_op.add_column(sa.Column('output_id', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('step_result') as batch_op:
+        batch_op.drop_column('output_id')
@@ -1,6 +1,14 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, deferred, validates
 
 db = SQLAlchemy()
 
@@ -26,16 +34,32 @@ class SSHHost(db.Model):
     username = db.Column(db.String(100), nullable=False)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
     group = db.relationship('Group', back_populates='ssh_hosts')
-    __table_args__ = (db.UniqueConstraint('friendly_name', 'group_id', name='_friendly_name_group_uc'),)
+    __table_args__ = (db.UniqueConstraint('friendly_name', 'group_id', name='_friendly_name_group_uc'),
+                      # Listings filter on group_id and sort by name; the unique constraint leads with the name.
+                      db.Index('ix_ssh_host_group_name', 'group_id', 'friendly_name'))
 
 class SavedScript(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     script_type = db.Column(db.String(50), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    # Loaded only when accessed; listings use content_size/content_hash instead.
+    content = deferred(db.Column(db.Text, nullable=False))
+    content_size = db.Column(db.Integer, nullable=False, default=0)
+    content_hash = db.Column(db.String(64))
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
     group = db.relationship('Group', back_populates='saved_scripts')
-    __table_args__ = (db.UniqueConstraint('name', 'group_id', name='_script_name_group_uc'),)
+    __table_args__ = (db.UniqueConstraint('name', 'group_id', name='_script_name_group_uc'),
+                      db.Index('ix_saved_script_group_name', 'group_id', 'name'))
+
+    @validates('content')
+    def _track_content(self, key, content):
+        """Keeps content_size (UTF-8 bytes) and content_hash (SHA-256 hex) in step with content."""
+        self.content_size, self.content_hash = content_digest(content)
+        return content
+
+def content_digest(content):
+    data = (content or '').encode('utf-8')
+    return len(data), hashlib.sha256(data).hexdigest()
 
 class Pipeline(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -44,14 +68,156 @@ class Pipeline(db.Model):
     edges = db.Column(db.Text, nullable=False)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=False)
     group = db.relationship('Group', back_populates='pipelines')
-    __table_args__ = (db.UniqueConstraint('name', 'group_id', name='_pipeline_name_group_uc'),)
+    runs = db.relationship('PipelineRun', back_populates='pipeline', cascade="all, delete-orphan", lazy='dynamic')
+    __table_args__ = (db.UniqueConstraint('name', 'group_id', name='_pipeline_name_group_uc'),
+                      db.Index('ix_pipeline_group_name', 'group_id', 'name'))
 
 class Schedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
-    host_id = db.Column(db.Integer, db.ForeignKey('ssh_host.id'), nullable=False)
-    script_id = db.Column(db.Integer, db.ForeignKey('saved_script.id'), nullable=False)
-    hour = db.Column(db.Integer, nullable=False)
-    minute = db.Column(db.Integer, nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id'))
+    # What runs: a saved script on one host (host_id) or a set of hosts (host_ids, a JSON list), or a pipeline.
+    host_id = db.Column(db.Integer, db.ForeignKey('ssh_host.id'))
+    host_ids = db.Column(db.Text)
+    script_id = db.Column(db.Integer, db.ForeignKey('saved_script.id'))
+    pipeline_id = db.Column(db.Integer, db.ForeignKey('pipeline.id'))
+    # When it runs: 'daily' at hour:minute, a five-field 'cron' expression, or every interval_seconds ('interval').
+    trigger_type = db.Column(db.String(20), nullable=False, default='daily')
+    hour = db.Column(db.Integer)
+    minute = db.Column(db.Integer)
+    cron_expression = db.Column(db.String(100))
+    interval_seconds = db.Column(db.Integer)
+    # Each run starts up to this many seconds late, so schedules sharing a time don't all fire at once.
+    jitter_seconds = db.Column(db.Integer)
     host = db.relationship('SSHHost')
     script = db.relationship('SavedScript')
+    pipeline = db.relationship('Pipeline')
+    # host_id/script_id/pipeline_id are looked up when a host, script or pipeline is deleted.
+    __table_args__ = (db.Index('ix_schedule_group_name', 'group_id', 'name'),
+                      db.Index('ix_schedule_host_id', 'host_id'),
+                      db.Index('ix_schedule_script_id', 'script_id'),
+                      db.Index('ix_schedule_pipeline_id', 'pipeline_id'))
+
+    def target_host_ids(self):
+        if self.host_ids: return json.loads(self.host_ids)
+        return [self.host_id] if self.host_id else []
+
+# Step output is stored up to this many characters; the tail is kept since errors usually end a log.
+MAX_STORED_OUTPUT = 64 * 1024
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class PipelineRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    pipeline_id = db.Column(db.Integer, db.ForeignKey('pipeline.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    dry_run = db.Column(db.Boolean, nullable=False, default=False)
+    triggered_by = db.Column(db.String(100))
+    started_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+    pipeline = db.relationship('Pipeline', back_populates='runs')
+    steps = db.relationship('StepResult', back_populates='run', cascade="all, delete-orphan", lazy='dynamic')
+    __table_args__ = (db.Index('ix_pipeline_run_pipeline_started', 'pipeline_id', 'started_at', 'id'),)
+
+class StepResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('pipeline_run.id'), nullable=False)
+    node_id = db.Column(db.Integer)
+    node_name = db.Column(db.String(100), nullable=False)
+    node_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+    output = db.Column(db.Text)
+    output_size = db.Column(db.Integer, nullable=False, default=0)
+    output_truncated = db.Column(db.Boolean, nullable=False, default=False)
+    # Set when the step's full output was spilled to the output store (see output_store.py).
+    output_id = db.Column(db.String(32))
+    run = db.relationship('PipelineRun', back_populates='steps')
+    __table_args__ = (db.Index('ix_step_result_run', 'run_id', 'id'),)
+
+    def set_output(self, text):
+        """Stores output capped at MAX_STORED_OUTPUT characters, keeping the tail."""
+        text = text or ''
+        self.output_size = len(text)
+        self.output_truncated = len(text) > MAX_STORED_OUTPUT
+        self.output = text[-MAX_STORED_OUTPUT:] if self.output_truncated else text
+
+# --- Change Counters ---
+# Other processes (e.g. the scheduler) poll a Revision row instead of rescanning
+# whole tables to notice edits. Counters are bumped in the same transaction as
+# the ORM change that caused them, so a reader never sees the new counter
+# without the new data.
+
+class Revision(db.Model):
+    scope = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+def group_scope(group_id):
+    """Revision scope bumped by any change to a group's hosts, scripts or pipelines."""
+    return f"group:{group_id}"
+
+# model class -> function(instance) returning the revision scopes it bumps
+REVISION_SCOPES = {
+    Schedule: lambda schedule: ['schedules'],
+    SSHHost: lambda host: [group_scope(host.group_id)],
+    SavedScript: lambda script: [group_scope(script.group_id)],
+    Pipeline: lambda pipeline: [group_scope(pipeline.group_id)],
+}
+
+def get_revision(scope):
+    return db.session.query(Revision.value).filter_by(scope=scope).scalar() or 0
+
+@event.listens_for(Session, 'after_flush')
+def _bump_revisions(session, flush_context):
+    scopes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        scopes_for = REVISION_SCOPES.get(type(obj))
+        if scopes_for and (obj not in session.dirty or session.is_modified(obj)):
+            scopes.update(scopes_for(obj))
+    if not scopes: return
+    conn = session.connection()
+    table = Revision.__table__
+    # An upsert, so two writers creating the same scope at once can't collide on the primary key.
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(conn.dialect.name)
+    for scope in sorted(scopes):
+        if dialect:
+            stmt = dialect.insert(table).values(scope=scope, value=1)
+            conn.execute(stmt.on_conflict_do_update(index_elements=[table.c.scope], set_={'value': table.c.value + 1}))
+            continue
+        result = conn.execute(table.update().where(table.c.scope == scope).values(value=table.c.value + 1))
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(scope=scope, value=1))
+
+# --- Leases ---
+# A named lease held by one process at a time, e.g. the scheduler leader.
+# Holders renew it before it expires; anyone may take it over afterwards.
+
+class Lease(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.Float, nullable=False)
+
+def acquire_lease(name, holder, ttl):
+    """Takes or renews the lease `name` for `holder`. Returns True if `holder` now holds it."""
+    now = time.time()
+    table = Lease.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(table.update()
+                              .where(table.c.name == name)
+                              .where((table.c.holder == holder) | (table.c.expires_at < now))
+                              .values(holder=holder, expires_at=now + ttl))
+        if result.rowcount: return True
+        if conn.execute(table.select().where(table.c.name == name)).first(): return False
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(name=name, holder=holder, expires_at=now + ttl))
+        return True
+    except IntegrityError:
+        return False
+
+def release_lease(name, holder):
+    table = Lease.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.name == name).where(table.c.holder == holder))
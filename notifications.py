@@ -0,0 +1,205 @@
+# notifications.py
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import requests
+
+# --- Notification Dispatcher ---
+# Discord and email notifications are queued and delivered by a background
+# worker, so a slow webhook or mail server never holds up a pipeline or a
+# scheduled task. The worker keeps one SMTP session open between messages,
+# posts through a pooled requests.Session, retries with exponential backoff,
+# and, when NOTIFY_DIGEST_WINDOW is set, merges reports that arrive within
+# that many seconds into a single email / Discord message.
+
+SMTP_SETTINGS = ['EMAIL_TO', 'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USER', 'SMTP_PASSWORD']
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 2.0
+SMTP_IDLE_TIMEOUT = 60
+DISCORD_MAX_EMBEDS = 10
+
+class NotificationDispatcher:
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._smtp = None
+        self._smtp_key = None
+        self._smtp_last_used = 0
+        self.sent = 0
+        self.failed = 0
+
+    # --- Public API ---
+    def send_discord(self, config, embed, on_result=None):
+        """Queues a Discord embed. `on_result(ok, message)` is called from the worker after delivery."""
+        webhook_url = config.get('DISCORD_WEBHOOK_URL')
+        if not webhook_url: return False
+        self._enqueue({'channel': 'discord', 'target': webhook_url, 'embed': embed, 'on_result': on_result,
+                       'digest_window': float(config.get('NOTIFY_DIGEST_WINDOW', 0) or 0)})
+        return True
+
+    def send_email(self, config, subject, html_body, on_result=None):
+        """Queues an HTML email. Returns False without queueing if SMTP settings are incomplete."""
+        if not all(config.get(key) for key in SMTP_SETTINGS): return False
+        smtp = {key: config[key] for key in SMTP_SETTINGS}
+        self._enqueue({'channel': 'email', 'target': tuple(smtp.values()), 'smtp': smtp, 'subject': subject, 'html': html_body,
+                       'on_result': on_result, 'digest_window': float(config.get('NOTIFY_DIGEST_WINDOW', 0) or 0)})
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stop(self, timeout=30):
+        """Delivers everything still queued (up to `timeout` seconds) and closes the SMTP session."""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    # --- Worker ---
+    def _enqueue(self, message):
+        message['queued_at'] = time.monotonic()
+        with self._start_lock:
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                self._thread.start()
+        self._queue.put(message)
+
+    def _run(self):
+        while True:
+            try:
+                message = self._queue.get(timeout=SMTP_IDLE_TIMEOUT / 2)
+            except queue.Empty:
+                self._close_idle_smtp()
+                continue
+            if message is None:
+                self._drain_remaining()
+                self._close_smtp()
+                return
+            batch = self._collect_digest(message)
+            self._deliver_batch(batch)
+
+    def _collect_digest(self, first):
+        """Gathers messages for the same channel and target that arrive within the digest window."""
+        batch, others = [first], []
+        window = first['digest_window']
+        deadline = first['queued_at'] + window
+        while window:
+            # Once the window has passed, still sweep up matching messages that are already queued.
+            remaining = deadline - time.monotonic()
+            try:
+                message = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                others.append(message)
+                break
+            if (message['channel'], message['target']) == (first['channel'], first['target']):
+                batch.append(message)
+            else:
+                others.append(message)
+        for message in others:
+            self._queue.put(message)
+        return batch
+
+    def _drain_remaining(self):
+        while True:
+            try:
+                message = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if message is not None:
+                self._deliver_batch([message])
+
+    def _deliver_batch(self, batch):
+        channel = batch[0]['channel']
+        if channel == 'discord':
+            embeds = [m['embed'] for m in batch]
+            chunks = [embeds[i:i + DISCORD_MAX_EMBEDS] for i in range(0, len(embeds), DISCORD_MAX_EMBEDS)]
+            ok, error = True, None
+            for chunk in chunks:
+                chunk_ok, chunk_error = self._with_retry(self._post_discord, batch[0]['target'], chunk)
+                ok, error = ok and chunk_ok, error or chunk_error
+            message = "Discord notification sent." if ok else f"Failed to send Discord notification: {error}"
+        else:
+            if len(batch) == 1:
+                subject, html = batch[0]['subject'], batch[0]['html']
+            else:
+                subject = f"Digest: {len(batch)} reports"
+                html = '<hr>'.join(m['html'] for m in batch)
+            ok, error = self._with_retry(self._send_smtp, batch[0]['smtp'], subject, html)
+            message = f"Email notification sent to {batch[0]['smtp']['EMAIL_TO']}" if ok else f"Failed to send email: {error}"
+
+        if ok: self.sent += len(batch)
+        else: self.failed += len(batch)
+        for m in batch:
+            if m['on_result']:
+                try:
+                    m['on_result'](ok, message)
+                except Exception as e:
+                    print(f"Notification callback failed: {e}")
+        if not any(m['on_result'] for m in batch):
+            print(message)
+
+    def _with_retry(self, send, *args):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                send(*args)
+                return True, None
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    time.sleep(delay)
+                    delay *= 2
+        return False, error
+
+    # --- Transports ---
+    def _post_discord(self, webhook_url, embeds):
+        response = self.session.post(webhook_url, json={"embeds": embeds}, timeout=15)
+        response.raise_for_status()
+
+    def _send_smtp(self, smtp, subject, html_body):
+        msg = MIMEMultipart()
+        msg['From'] = smtp['SMTP_USER']
+        msg['To'] = smtp['EMAIL_TO']
+        msg['Subject'] = subject
+        msg.attach(MIMEText(html_body, 'html'))
+        try:
+            self._smtp_connection(smtp).send_message(msg)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # The server dropped our idle session; reconnect and let the retry loop resend.
+            self._close_smtp()
+            raise
+        self._smtp_last_used = time.monotonic()
+
+    def _smtp_connection(self, smtp):
+        key = (smtp['SMTP_SERVER'], int(smtp['SMTP_PORT']), smtp['SMTP_USER'], smtp['SMTP_PASSWORD'])
+        if self._smtp and self._smtp_key != key:
+            self._close_smtp()
+        if not self._smtp:
+            server = smtplib.SMTP(smtp['SMTP_SERVER'], int(smtp['SMTP_PORT']), timeout=30)
+            server.starttls()
+            server.login(smtp['SMTP_USER'], smtp['SMTP_PASSWORD'])
+            self._smtp, self._smtp_key = server, key
+        return self._smtp
+
+    def _close_idle_smtp(self):
+        if self._smtp and time.monotonic() - self._smtp_last_used > SMTP_IDLE_TIMEOUT:
+            self._close_smtp()
+
+    def _close_smtp(self):
+        if self._smtp:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+        self._smtp, self._smtp_key = None, None
+
+# Process-wide dispatcher shared by the pipeline runner and the scheduler.
+notification_dispatcher = NotificationDispatcher()
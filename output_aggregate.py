@@ -0,0 +1,100 @@
+# output_aggregate.py
+import difflib
+import hashlib
+from output_reducer import mask_volatile
+
+# --- Output Aggregation ---
+# A command run on many hosts mostly produces the same output everywhere
+# (a package version check on 500 machines). With `aggregate` set, /api/run
+# groups the hosts by a hash of their status, output and error and returns
+# each distinct result once with the hosts that produced it. Groups other than
+# the largest one carry a unified diff against it, so the odd hosts out are
+# visible at a glance. Results are folded in as hosts finish, so only one
+# copy of each distinct output is held in memory.
+#
+# Modes:
+#   'exact'      - outputs must match byte for byte. For output spilled to the
+#                  output store the hash of the complete text is used, so
+#                  outputs differing only in the omitted middle stay apart.
+#   'normalized' - timestamps, UUIDs and hex ids are masked first (see
+#                  output_reducer.VOLATILE_PATTERNS), comparing the kept head
+#                  and tail only.
+
+AGGREGATE_MODES = ('exact', 'normalized')
+DEFAULT_DIFF_CONTEXT = 2
+MAX_DIFF_LINES = 400
+# Beyond this many groups the hosts are too different for diffs to help; the smaller groups get none.
+MAX_DIFFED_GROUPS = 50
+
+class ResultAggregator:
+    def __init__(self, mode='exact', store=None, diff_context=DEFAULT_DIFF_CONTEXT):
+        if mode not in AGGREGATE_MODES:
+            raise ValueError(f"aggregate must be one of {', '.join(AGGREGATE_MODES)}.")
+        self.mode, self.store, self.diff_context = mode, store, diff_context
+        self.host_count = 0
+        self.status_counts = {}
+        self._groups = {}
+
+    def _stream_key(self, text, output_id):
+        if self.mode == 'exact' and output_id and self.store:
+            meta = self.store.info(output_id)
+            if meta and meta.get('sha256'):
+                return 'sha256:' + meta['sha256']
+        return mask_volatile(text or '') if self.mode == 'normalized' else text or ''
+
+    def key(self, result):
+        digest = hashlib.sha256()
+        for part in (result['status'], self._stream_key(result['output'], result.get('output_id')),
+                     self._stream_key(result['error'], result.get('error_id'))):
+            digest.update(part.encode('utf-8', 'surrogatepass') + b'\0')
+        return digest.hexdigest()[:16]
+
+    def add(self, result):
+        self.host_count += 1
+        self.status_counts[result['status']] = self.status_counts.get(result['status'], 0) + 1
+        key = self.key(result)
+        group = self._groups.get(key)
+        if group is None:
+            # The first host of a group represents it; later hosts only add their name and ids.
+            group = self._groups[key] = {'hash': key, 'status': result['status'], 'output': result['output'], 'error': result['error'],
+                                         'hosts': [], 'output_ids': {}, 'error_ids': {}, 'max_duration': 0}
+        group['hosts'].append(result['host_name'])
+        for field, ids in (('output_id', group['output_ids']), ('error_id', group['error_ids'])):
+            if result.get(field):
+                ids[result['host_name']] = result[field]
+        group['max_duration'] = max(group['max_duration'], result.get('duration') or 0)
+
+    def result(self):
+        """The response body: groups largest first (ties in the order first seen), each non-majority group with a diff."""
+        groups = sorted(self._groups.values(), key=lambda g: -len(g['hosts']))
+        for index, group in enumerate(groups):
+            group['count'] = len(group['hosts'])
+            group['majority'] = index == 0
+            group['diff'] = self._diff(groups[0], group) if 0 < index <= MAX_DIFFED_GROUPS else None
+        return {'aggregate': self.mode, 'host_count': self.host_count, 'group_count': len(groups),
+                'status_counts': self.status_counts, 'groups': groups}
+
+    def _diff(self, majority, group):
+        lines = list(difflib.unified_diff(_diff_lines(majority), _diff_lines(group), f"majority ({_hosts(majority)})",
+                                          f"this group ({_hosts(group)})", n=self.diff_context, lineterm=''))
+        if len(lines) > MAX_DIFF_LINES:
+            lines = lines[:MAX_DIFF_LINES] + [f"[... {len(lines) - MAX_DIFF_LINES} more diff lines not shown]"]
+        return '\n'.join(lines)
+
+def _hosts(group):
+    return f"{len(group['hosts'])} host{'' if len(group['hosts']) == 1 else 's'}"
+
+def _diff_lines(group):
+    lines = (group['output'] or '').splitlines()
+    if group['error']:
+        lines += ['--- stderr ---'] + group['error'].splitlines()
+    if group['status'] != 'success':
+        lines.append(f"[status: {group['status']}]")
+    return lines
+
+def aggregate_results(results, mode='exact', store=None):
+    """Folds an iterable of per-host results into the aggregated response body."""
+    aggregator = ResultAggregator(mode, store)
+    for result in results:
+        aggregator.add(result)
+    return aggregator.result()
@@ -0,0 +1,219 @@
+# output_reducer.py
+import re
+from collections import deque
+
+# --- Output Reduction ---
+# Command output is reduced before it is handed to AI analysis (and by the
+# 'reduce-output' pipeline step). The reducer reads the output once, line by
+# line, in bounded memory, and keeps:
+#   - the first and last lines,
+#   - a few lines of context around each distinct error line,
+#   - every other line only as a count per template, where a template is the
+#     line with every token containing a digit masked, so 50,000 "GET /health
+#     200 in 3ms" lines become one entry.
+# The result is capped at max_tokens (estimated at CHARS_PER_TOKEN characters
+# per token). Output that already fits is returned unchanged.
+
+DEFAULT_MAX_TOKENS = 8000
+DEFAULT_HEAD_LINES = 40
+DEFAULT_TAIL_LINES = 80
+DEFAULT_CONTEXT_LINES = 3
+CHARS_PER_TOKEN = 4
+MAX_TEMPLATES = 5000
+MAX_ERROR_WINDOWS = 50
+MAX_WINDOW_LINES = 40
+MAX_LINE_CHARS = 500
+# How the token budget is split between the sections of a reduced output, most useful first.
+BUDGET_SHARES = (('errors', 0.4), ('repeated', 0.2), ('tail', 0.25), ('head', 0.15))
+
+# Lines containing any of these (case-insensitively) get error context.
+ERROR_WORDS = ('error', 'fail', 'fatal', 'exception', 'traceback', 'panic', 'critical', 'denied', 'refused',
+               'timed out', 'timeout', 'segfault', 'killed', 'oom-kill', 'out of memory', 'unreachable')
+
+# Run-to-run noise: masked by analysis.normalize_output for its cache key.
+VOLATILE_PATTERNS = [
+    (re.compile(r'\x1b\[[0-9;?]*[A-Za-z]'), ''),
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<timestamp>'),
+    (re.compile(r'\b(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun)?,? ?(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) +\d{1,2}(?: \d{4})? \d{2}:\d{2}:\d{2}\b'), '<timestamp>'),
+    (re.compile(r'\b\d{1,2}:\d{2}:\d{2}(?:\.\d+)?\b'), '<time>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'\b(?=[0-9a-f]*\d)[0-9a-f]{12,}\b'), '<id>'),
+    (re.compile(r'[ \t]+'), ' '),
+]
+# Templates are coarser and must be cheap on multi-MB input: every token containing
+# a digit (timestamps, ids, durations, sizes, pids) becomes <*>.
+TEMPLATE_PATTERNS = [
+    (re.compile(r'\x1b\[[0-9;?]*[A-Za-z]'), ''),
+    (re.compile(r'(?<![\w.:+/-])[\w.:+-]*?\d[\w.:+-]*'), '<*>'),
+    (re.compile(r'[ \t]{2,}'), ' '),
+]
+
+def mask_volatile(text, patterns=VOLATILE_PATTERNS):
+    """Replaces run-to-run noise in `text`. No pattern spans a newline, so the line count is unchanged."""
+    for pattern, replacement in patterns:
+        text = pattern.sub(replacement, text)
+    return text
+
+def _error_lines(block):
+    """Indexes of the lines in `block` that contain an ERROR_WORDS entry."""
+    lowered = block.lower()
+    found = set()
+    for word in ERROR_WORDS:
+        position, line, counted = lowered.find(word), 0, 0
+        while position >= 0:
+            line += lowered.count('\n', counted, position)
+            counted = position
+            found.add(line)
+            end = lowered.find('\n', position)
+            if end < 0: break
+            position = lowered.find(word, end)
+    return found
+
+def _clip(line):
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + f" [... {len(line) - MAX_LINE_CHARS} characters]"
+
+class OutputReducer:
+    """Reduces output fed in arbitrary chunks; call result() once everything has been fed."""
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, head_lines=DEFAULT_HEAD_LINES, tail_lines=DEFAULT_TAIL_LINES,
+                 context_lines=DEFAULT_CONTEXT_LINES):
+        self.max_tokens = max_tokens
+        self.max_chars = max_tokens * CHARS_PER_TOKEN
+        self.head_lines, self.context_lines = head_lines, context_lines
+        self.lines = self.chars = self.error_lines = self.untracked = 0
+        # The raw text, kept only while it still fits in the budget unreduced.
+        self._raw, self._raw_size = [], 0
+        self._partial = ''
+        self._head = []
+        self._tail = deque(maxlen=tail_lines)
+        self._before = deque(maxlen=context_lines)
+        self._windows = []
+        self._after = 0
+        self._templates = {}
+        self._error_templates = set()
+        self._closed = False
+
+    def feed(self, text):
+        if not text: return
+        self.chars += len(text)
+        if self._raw is not None:
+            self._raw_size += len(text)
+            if self._raw_size <= self.max_chars:
+                self._raw.append(text)
+            else:
+                self._raw = None
+        text = self._partial + text
+        end = text.rfind('\n')
+        if end < 0:
+            self._partial = text
+            return
+        self._partial = text[end + 1:]
+        self._feed_lines(text[:end])
+
+    def _feed_lines(self, block):
+        # Masking and searching the whole block at once is several times faster than line by line.
+        errors = _error_lines(block)
+        templates = mask_volatile(block, TEMPLATE_PATTERNS).split('\n')
+        for index, line in enumerate(block.split('\n')):
+            self._add_line(line.rstrip('\r'), templates[index].strip(), index in errors)
+
+    def _add_line(self, line, template, is_error):
+        self.lines += 1
+        number = self.lines
+        if len(self._head) < self.head_lines:
+            self._head.append(_clip(line))
+        count = self._templates.get(template)
+        if count is not None:
+            self._templates[template] = count + 1
+        elif len(self._templates) < MAX_TEMPLATES:
+            self._templates[template] = 1
+        else:
+            self.untracked += 1
+        if is_error:
+            self.error_lines += 1
+            # Only the first occurrence of an error template gets context; repeats are counted above.
+            if template not in self._error_templates:
+                self._error_templates.add(template)
+                if self._after:
+                    self._after = self.context_lines + 1
+                elif len(self._windows) < MAX_ERROR_WINDOWS:
+                    last = self._windows[-1][-1][0] if self._windows else 0
+                    self._windows.append([entry for entry in self._before if entry[0] > last])
+                    self._after = self.context_lines + 1
+        entry = (number, _clip(line))
+        if self._after:
+            window = self._windows[-1]
+            window.append(entry)
+            self._after = self._after - 1 if len(window) < MAX_WINDOW_LINES else 0
+        self._before.append(entry)
+        self._tail.append(entry)
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        if self._partial:
+            self._feed_lines(self._partial)
+            self._partial = ''
+
+    @property
+    def reduced(self):
+        return self._raw is None
+
+    def result(self):
+        self.close()
+        if self._raw is not None:
+            return ''.join(self._raw)
+        header = (f"[Output reduced from {self.lines} lines ({self.chars} characters) to about {self.max_tokens} tokens: "
+                  f"{len(self._templates)} distinct line patterns, {self.error_lines} lines mentioning errors"
+                  + (f", {self.untracked} lines past the pattern limit" if self.untracked else '') + ".]")
+        head_end = len(self._head)
+        repeated = sorted(((count, template) for template, count in self._templates.items() if count > 1), reverse=True)
+        sections = {
+            'errors': ("Error context (first occurrence of each distinct error)",
+                       [f"{number}: {line}" for window in self._windows for number, line in window]),
+            'tail': ("Last lines", [f"{number}: {line}" for number, line in self._tail if number > head_end]),
+            'head': ("First lines", [f"{number}: {line}" for number, line in enumerate(self._head, 1)]),
+            'repeated': ("Repeated line patterns (count, pattern)", [f"{count}x {_clip(template)}" for count, template in repeated]),
+        }
+        # Each section first gets its share of the budget, then what is left over goes
+        # to the sections in order of usefulness. They are printed in reading order.
+        total = self.max_chars - len(header) - sum(len(title) + 8 for title, _ in sections.values())
+        remaining = total
+        kept = {name: [] for name in sections}
+        for first_pass in (True, False):
+            for name, share in BUDGET_SHARES:
+                allowance = min(remaining, int(total * share)) if first_pass else remaining
+                lines, taken = sections[name][1], kept[name]
+                while len(taken) < len(lines) and len(lines[len(taken)]) + 1 <= allowance:
+                    allowance -= len(lines[len(taken)]) + 1
+                    remaining -= len(lines[len(taken)]) + 1
+                    taken.append(lines[len(taken)])
+        parts = [header]
+        for name in ('head', 'errors', 'repeated', 'tail'):
+            title, lines = sections[name]
+            if not lines: continue
+            parts.append(f"--- {title} ---")
+            parts.extend(kept[name])
+            if len(kept[name]) < len(lines):
+                parts.append(f"[... {len(lines) - len(kept[name])} more not shown]")
+        return '\n'.join(parts)
+
+def output_reducer(config):
+    """An OutputReducer sized from config."""
+    return OutputReducer(int(config.get('REDUCE_MAX_TOKENS', DEFAULT_MAX_TOKENS)),
+                         int(config.get('REDUCE_HEAD_LINES', DEFAULT_HEAD_LINES)),
+                         int(config.get('REDUCE_TAIL_LINES', DEFAULT_TAIL_LINES)),
+                         int(config.get('REDUCE_CONTEXT_LINES', DEFAULT_CONTEXT_LINES)))
+
+def reduce_output(config, text='', store=None, output_id=None):
+    """
+    Reduces an output. When the output was spilled (`output_id` in `store`),
+    the complete spilled text is read block by block instead of `text`, which
+    then only holds its head and tail.
+    """
+    reducer = output_reducer(config)
+    meta = store.info(output_id) if store and output_id else None
+    for chunk in (store.read_text(meta) if meta else [text or '']):
+        reducer.feed(chunk)
+    return reducer.result()
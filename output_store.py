@@ -0,0 +1,215 @@
+# output_store.py
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from output_stream import OutputTail, DEFAULT_TAIL_CHARS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- Output Capture ---
+# Results keep the first OUTPUT_HEAD_CHARS and the last STREAM_TAIL_CHARS
+# characters of each stream. Once a stream outgrows both, everything it
+# produced (including what was already seen) is also written to a compressed
+# file in the output store, so the middle can be fetched later through
+# GET /api/outputs/<output_id> without keeping it in memory or in responses.
+
+DEFAULT_HEAD_CHARS = 64 * 1024
+
+class OutputCapture:
+    """Head + tail of a stream, spilling the full text to `store` once it outgrows them."""
+
+    def __init__(self, head_chars=DEFAULT_HEAD_CHARS, tail_chars=DEFAULT_TAIL_CHARS, store=None, group_id=None, label=''):
+        self.head_chars = head_chars
+        self.store, self.group_id, self.label = store, group_id, label
+        self._head = []
+        self._head_size = 0
+        self._tail = OutputTail(tail_chars)
+        self._spill = None
+        self.total_chars = 0
+
+    @property
+    def truncated(self):
+        return self.total_chars > self.head_chars + self._tail.max_chars
+
+    @property
+    def output_id(self):
+        return self._spill.output_id if self._spill else None
+
+    def write(self, text):
+        if not text: return
+        if self.store and not self._spill and self.total_chars + len(text) > self.head_chars + self._tail.max_chars:
+            # Nothing has been dropped yet, so head + tail is still the complete text so far.
+            self._spill = self.store.create(self.group_id, self.label)
+            self._spill.write(''.join(self._head) + self._tail.getvalue())
+        if self._spill:
+            self._spill.write(text)
+        self.total_chars += len(text)
+        if self._head_size < self.head_chars:
+            part = text[:self.head_chars - self._head_size]
+            self._head.append(part)
+            self._head_size += len(part)
+            text = text[len(part):]
+        self._tail.write(text)
+
+    def getvalue(self):
+        head = ''.join(self._head)
+        if not self.truncated:
+            return head + self._tail.getvalue()
+        tail = self._tail.getvalue().split('\n', 1)[1]  # drop OutputTail's own marker line
+        omitted = self.total_chars - len(head) - len(tail)
+        where = f"; full output: /api/outputs/{self.output_id}" if self.output_id else ''
+        return f"{head}\n[... {omitted} characters omitted{where} ...]\n{tail}"
+
+    def close(self):
+        if self._spill: self._spill.close()
+
+def output_captures(config, store=None, group_id=None, label=''):
+    """One OutputCapture per stream, sized from config."""
+    head_chars = int(config.get('OUTPUT_HEAD_CHARS', DEFAULT_HEAD_CHARS))
+    tail_chars = int(config.get('STREAM_TAIL_CHARS', DEFAULT_TAIL_CHARS))
+    return {stream: OutputCapture(head_chars, tail_chars, store, group_id, f"{label} {stream}".strip())
+            for stream in ('stdout', 'stderr')}
+
+# --- Output Store ---
+# Spilled output is stored as <id>.<codec> plus an <id>.json index. The data
+# file is a series of independently compressed blocks of BLOCK_SIZE bytes
+# (concatenated gzip members or zstd frames, so `zcat`/`zstdcat` read it as
+# one stream); the index maps each block's uncompressed offset to its file
+# offset, so a byte range is served by decompressing only the blocks it covers.
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(basedir, 'outputs')
+DEFAULT_RETENTION_HOURS = 168
+BLOCK_SIZE = 1024 * 1024
+PRUNE_INTERVAL = 600
+
+CODECS = {
+    'gzip': (lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+}
+if zstandard:
+    CODECS['zstd'] = (lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+class SpillWriter:
+    def __init__(self, store, output_id, group_id, label):
+        self.store, self.output_id = store, output_id
+        self.meta = {'id': output_id, 'group_id': group_id, 'label': label, 'codec': store.codec,
+                     'created_at': time.time(), 'size': 0, 'blocks': []}
+        self._compress = CODECS[store.codec][0]
+        self._file = open(store.data_path(output_id, store.codec), 'wb')
+        self._pending = bytearray()
+        # Lets fan-out runs tell apart outputs whose kept head and tail are identical.
+        self._sha256 = hashlib.sha256()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._sha256.update(data)
+        self._pending += data
+        while len(self._pending) >= BLOCK_SIZE:
+            self._write_block(bytes(self._pending[:BLOCK_SIZE]))
+            del self._pending[:BLOCK_SIZE]
+
+    def _write_block(self, data):
+        self.meta['blocks'].append([self.meta['size'], self._file.tell()])
+        self._file.write(self._compress(data))
+        self.meta['size'] += len(data)
+
+    def close(self):
+        if self._file.closed: return
+        if self._pending:
+            self._write_block(bytes(self._pending))
+            self._pending = bytearray()
+        self.meta['compressed_size'] = self._file.tell()
+        self.meta['sha256'] = self._sha256.hexdigest()
+        self._file.close()
+        # The index appears last and atomically; until then the output reads as not found.
+        tmp_path = self.store.meta_path(self.output_id) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.store.meta_path(self.output_id))
+
+class OutputStore:
+    def __init__(self, directory=DEFAULT_OUTPUT_DIR, codec='gzip', retention_hours=DEFAULT_RETENTION_HOURS):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown OUTPUT_COMPRESSION '{codec}'." + (" Install the zstandard package to use zstd." if codec == 'zstd' else ''))
+        self.directory, self.codec, self.retention_hours = directory, codec, retention_hours
+        os.makedirs(directory, exist_ok=True)
+        self._last_prune = 0
+        self._prune_lock = threading.Lock()
+
+    def data_path(self, output_id, codec):
+        return os.path.join(self.directory, f"{output_id}.{codec}")
+
+    def meta_path(self, output_id):
+        return os.path.join(self.directory, f"{output_id}.json")
+
+    def create(self, group_id, label=''):
+        self.prune()
+        return SpillWriter(self, uuid.uuid4().hex, group_id, label)
+
+    def info(self, output_id):
+        """The index of a finished output, or None if it doesn't exist (yet)."""
+        if not output_id.isalnum(): return None
+        try:
+            with open(self.meta_path(output_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read(self, meta, start=0, stop=None):
+        """Yields the uncompressed bytes [start, stop) of an output, one block at a time."""
+        stop = meta['size'] if stop is None else min(stop, meta['size'])
+        decompress = CODECS[meta['codec']][1]
+        blocks = meta['blocks'] + [[meta['size'], meta['compressed_size']]]
+        with open(self.data_path(meta['id'], meta['codec']), 'rb') as f:
+            for (offset, file_offset), (next_offset, next_file_offset) in zip(blocks, blocks[1:]):
+                if next_offset <= start: continue
+                if offset >= stop: break
+                f.seek(file_offset)
+                data = decompress(f.read(next_file_offset - file_offset))
+                yield data[max(start - offset, 0):stop - offset]
+
+    def read_text(self, meta):
+        """Yields a whole output as text, one block at a time."""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for data in self.read(meta):
+            yield decoder.decode(data)
+        yield decoder.decode(b'', final=True)
+
+    def prune(self):
+        """Deletes outputs older than the retention period; runs at most every PRUNE_INTERVAL seconds."""
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL or not self._prune_lock.acquire(blocking=False): return
+        try:
+            self._last_prune = now
+            cutoff = now - self.retention_hours * 3600
+            for entry in os.scandir(self.directory):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._prune_lock.release()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_output_store(config):
+    """Returns the configured output store, or None when OUTPUT_SPILL_DIR is set to an empty string."""
+    directory = config.get('OUTPUT_SPILL_DIR', DEFAULT_OUTPUT_DIR)
+    if not directory:
+        return None
+    key = (directory, config.get('OUTPUT_COMPRESSION', 'gzip'), float(config.get('OUTPUT_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = OutputStore(*key)
+        return _stores[key]
@@ -0,0 +1,145 @@
+# output_stream.py
+import codecs
+import socket
+import time
+
+# --- Streaming Remote Output ---
+# Remote commands can print far more than we want to hold in memory, so output
+# is read from the paramiko channel in chunks. Every chunk is handed to an
+# optional callback (usually a ChunkEmitter pushing to Socket.IO) and only a
+# bounded tail is kept for the final result.
+
+DEFAULT_CHUNK_SIZE = 32 * 1024
+DEFAULT_TAIL_CHARS = 256 * 1024
+DEFAULT_MAX_RATE = 256 * 1024
+DEFAULT_FLUSH_INTERVAL = 0.1
+
+class OutputTail:
+    """Keeps the last `max_chars` characters written to it and counts everything it dropped."""
+
+    def __init__(self, max_chars=DEFAULT_TAIL_CHARS):
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self.total_chars = 0
+
+    def write(self, text):
+        if not text: return
+        self.total_chars += len(text)
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size > self.max_chars * 2:
+            self._compact()
+
+    def _compact(self):
+        joined = ''.join(self._parts)[-self.max_chars:]
+        self._parts = [joined]
+        self._size = len(joined)
+
+    @property
+    def truncated(self):
+        return self.total_chars > self.max_chars
+
+    def getvalue(self):
+        self._compact()
+        text = self._parts[0] if self._parts else ''
+        if self.truncated:
+            return f"[... {self.total_chars - len(text)} characters truncated ...]\n{text}"
+        return text
+
+class ChunkEmitter:
+    """
+    Coalesces output chunks into frames and hands each frame to `emit(stream, data)`.
+    Frames are capped at `max_rate` characters per second; when the cap is hit
+    the emitter sleeps, which stops the caller from reading the channel and lets
+    the SSH window apply backpressure to the remote process.
+    """
+
+    def __init__(self, emit, sleep=time.sleep, max_rate=DEFAULT_MAX_RATE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.emit = emit
+        self.sleep = sleep
+        self.max_rate = max_rate
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+        self._window_start = self._last_flush
+        self._window_sent = 0
+
+    def __call__(self, stream, text):
+        self._pending.setdefault(stream, []).append(text)
+        self._pending_size += len(text)
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval or self._pending_size >= DEFAULT_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        for stream, parts in self._pending.items():
+            data = ''.join(parts)
+            if data:
+                self._throttle(len(data))
+                self.emit(stream, data)
+        self._pending = {}
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+
+    def _throttle(self, size):
+        if not self.max_rate: return
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start, self._window_sent = now, 0
+        self._window_sent += size
+        wait = self._window_sent / self.max_rate - (now - self._window_start)
+        if self._window_sent > self.max_rate and wait > 0:
+            self.sleep(wait)
+            self._window_start, self._window_sent = time.monotonic(), 0
+
+def stream_command(stdout, on_chunk=None, tail_chars=DEFAULT_TAIL_CHARS, chunk_size=DEFAULT_CHUNK_SIZE, timeout=None, captures=None,
+                   deadline=None):
+    """
+    Reads stdout and stderr of an exec_command channel incrementally.
+    Returns (output, error, exit_status) where output and error are bounded tails,
+    or whatever the given `captures` ({'stdout': ..., 'stderr': ...}, e.g.
+    output_store.OutputCapture) keep; captures are closed when the command ends.
+    Raises socket.timeout if the channel produces nothing for `timeout` seconds,
+    or if the command is still running at `deadline` (a time.monotonic() value),
+    however much output it keeps producing; the channel is closed either way.
+    """
+    channel = stdout.channel
+    decoders = {'stdout': codecs.getincrementaldecoder('utf-8')('replace'), 'stderr': codecs.getincrementaldecoder('utf-8')('replace')}
+    tails = captures or {'stdout': OutputTail(tail_chars), 'stderr': OutputTail(tail_chars)}
+    last_activity = time.monotonic()
+
+    def write(stream, text):
+        if text:
+            tails[stream].write(text)
+            if on_chunk: on_chunk(stream, text)
+
+    try:
+        while True:
+            if deadline and time.monotonic() > deadline:
+                raise socket.timeout("Deadline passed")
+            got_data = False
+            if channel.recv_ready():
+                write('stdout', decoders['stdout'].decode(channel.recv(chunk_size)))
+                got_data = True
+            if channel.recv_stderr_ready():
+                write('stderr', decoders['stderr'].decode(channel.recv_stderr(chunk_size)))
+                got_data = True
+            if got_data:
+                last_activity = time.monotonic()
+                continue
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            if timeout and time.monotonic() - last_activity > timeout:
+                raise socket.timeout(f"No output for {timeout}s")
+            time.sleep(0.05)
+        for stream, decoder in decoders.items():
+            write(stream, decoder.decode(b'', final=True))
+        if on_chunk and hasattr(on_chunk, 'flush'):
+            on_chunk.flush()
+        return tails['stdout'].getvalue(), tails['stderr'].getvalue(), channel.recv_exit_status()
+    finally:
+        channel.close()
+        for tail in tails.values():
+            if hasattr(tail, 'close'): tail.close()
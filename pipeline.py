@@ -1,10 +1,16 @@
 # pipeline.py
 import json
+from datetime import datetime
 from flask import request
 from flask_restx import Namespace, Resource
 from flask_login import login_required, current_user
-from models import db, Pipeline
-from run_pipeline import PipelineRunner
+from sqlalchemy import and_, or_
+from models import db, Pipeline, StepResult, PipelineRun as PipelineRunRecord
+from flask_socketio import join_room, leave_room
+from run_pipeline import PipelineRunner, run_room, pipeline_host_ids
+from job_queue import get_job_queue
+from config_service import load_config
+from http_cache import conditional_get
 
 # --- Namespace and Dependency Setup ---
 # This namespace will be imported by app.py and added to the main Api object.
@@ -23,6 +29,44 @@ def setup_pipeline_dependencies(app, socketio):
     global _app, _socketio
     _app = app
     _socketio = socketio
+    socketio.on_event('connect', track_socket)
+    socketio.on_event('disconnect', forget_socket)
+    socketio.on_event('join_run', join_run)
+    socketio.on_event('leave_run', leave_run)
+
+def _run_visible_to_current_user(run_id):
+    run = db.session.get(PipelineRunRecord, run_id) if run_id else None
+    return run is not None and current_user.is_authenticated and run.pipeline.group_id == current_user.group_id
+
+# --- Socket.IO Handlers ---
+# Pipeline logs are only sent to the room of the run they belong to.
+# Sockets connected to this process, by sid, with the id of the user who opened them.
+_socket_users = {}
+
+def track_socket(auth=None):
+    if current_user.is_authenticated:
+        _socket_users[request.sid] = current_user.id
+
+def forget_socket(*args):
+    _socket_users.pop(request.sid, None)
+
+def socket_of_current_user(sid):
+    """Whether `sid` is a socket the current user opened on this process."""
+    return bool(sid) and current_user.is_authenticated and _socket_users.get(sid) == current_user.id
+
+def join_run(data):
+    """Subscribes the calling socket to a run's log room."""
+    run_id = (data or {}).get('run_id')
+    if not _run_visible_to_current_user(run_id):
+        return {'status': 'error', 'message': 'Run not found or access denied.'}
+    join_room(run_room(run_id))
+    return {'status': 'success'}
+
+def leave_run(data):
+    run_id = (data or {}).get('run_id')
+    if run_id:
+        leave_room(run_room(run_id))
+    return {'status': 'success'}
 
 # --- API Resources for Pipelines ---
 
@@ -34,8 +78,10 @@ class PipelineList(Resource):
     def get(self):
         """List all pipelines for the current user's group."""
         # Filter pipelines by the user's group for security and relevance.
-        pipelines = Pipeline.query.filter_by(group_id=current_user.group_id).order_by(Pipeline.name).all()
-        return [{'id': p.id, 'name': p.name} for p in pipelines]
+        def build():
+            pipelines = Pipeline.query.filter_by(group_id=current_user.group_id).order_by(Pipeline.name).all()
+            return [{'id': p.id, 'name': p.name} for p in pipelines]
+        return conditional_get(current_user.group_id, build)
 
     @login_required
     def post(self):
@@ -62,17 +108,19 @@ class PipelineResource(Resource):
     @login_required
     def get(self, pipeline_id):
         """Retrieve a specific pipeline's details."""
-        pipeline = db.session.get(Pipeline, pipeline_id)
-        # Security check: Ensure the user can only access pipelines within their own group.
-        if not pipeline or pipeline.group_id != current_user.group_id:
-            return {'status': 'error', 'message': 'Pipeline not found or access denied.'}, 404
+        def build():
+            pipeline = db.session.get(Pipeline, pipeline_id)
+            # Security check: Ensure the user can only access pipelines within their own group.
+            if not pipeline or pipeline.group_id != current_user.group_id:
+                return {'status': 'error', 'message': 'Pipeline not found or access denied.'}, 404
 
-        return {
-            'id': pipeline.id,
-            'name': pipeline.name,
-            'nodes': json.loads(pipeline.nodes),
-            'edges': json.loads(pipeline.edges)
-        }
+            return {
+                'id': pipeline.id,
+                'name': pipeline.name,
+                'nodes': json.loads(pipeline.nodes),
+                'edges': json.loads(pipeline.edges)
+            }
+        return conditional_get(current_user.group_id, build)
     
     @login_required
     def put(self, pipeline_id):
@@ -113,10 +161,129 @@ class PipelineRun(Resource):
 
         data = request.json
         dry_run = data.get('dry_run', False)
-        
+
+        # Record the run up front so the client gets an ID it can look up in the run history.
+        run_record = PipelineRunRecord(pipeline_id=pipeline_id, status='queued', dry_run=bool(dry_run), triggered_by=current_user.username)
+        db.session.add(run_record)
+        db.session.commit()
+
+        # Subscribe the caller's socket before the run starts so the first log lines aren't missed. Only a
+        # socket the caller opened on this process is joined; otherwise the client joins with join_run.
+        socket_id = data.get('socket_id')
+        if socket_of_current_user(socket_id):
+            join_room(run_room(run_record.id), sid=socket_id, namespace='/')
+
+        queue = get_job_queue(load_config())
+        if queue:
+            # Hand the run to a worker process; hosts are recorded so per-host limits apply.
+            job_id = queue.enqueue('pipeline', {'pipeline_id': pipeline_id, 'dry_run': bool(dry_run), 'run_id': run_record.id},
+                                   group_id=pipeline.group_id, host_keys=pipeline_host_ids(pipeline))
+            return {'status': 'success', 'message': 'Pipeline execution queued.', 'run_id': run_record.id, 'job_id': job_id}
+
         # Instantiate the runner with the required dependencies.
-        runner = PipelineRunner(pipeline_id, _app, _socketio, dry_run)
+        runner = PipelineRunner(pipeline_id, _app, _socketio, dry_run, run_id=run_record.id)
         # Use socketio to run the pipeline in a background thread to avoid blocking the request.
         _socketio.start_background_task(runner.run)
         
-        return {'status': 'success', 'message': 'Pipeline execution started.'}
+        return {'status': 'success', 'message': 'Pipeline execution started.', 'run_id': run_record.id}
+
+# --- Run History ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _page_size():
+    try:
+        return max(1, min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _serialize_run(run):
+    return {
+        'id': run.id,
+        'pipeline_id': run.pipeline_id,
+        'status': run.status,
+        'dry_run': run.dry_run,
+        'triggered_by': run.triggered_by,
+        'started_at': _isoformat(run.started_at),
+        'finished_at': _isoformat(run.finished_at)
+    }
+
+def _serialize_step(step):
+    return {
+        'id': step.id,
+        'node_id': step.node_id,
+        'node_name': step.node_name,
+        'node_type': step.node_type,
+        'status': step.status,
+        'started_at': _isoformat(step.started_at),
+        'finished_at': _isoformat(step.finished_at),
+        'output': step.output,
+        'output_size': step.output_size,
+        'output_truncated': step.output_truncated,
+        'output_id': step.output_id
+    }
+
+@pipelines_ns.route('/<int:pipeline_id>/runs')
+class PipelineRunList(Resource):
+    """Lists the run history of a pipeline, newest first."""
+
+    @login_required
+    def get(self, pipeline_id):
+        """
+        List runs of a pipeline using keyset pagination.
+        Pass the returned `next_cursor` as `?cursor=` to fetch the next page.
+        """
+        pipeline = db.session.get(Pipeline, pipeline_id)
+        if not pipeline or pipeline.group_id != current_user.group_id:
+            return {'status': 'error', 'message': 'Pipeline not found or access denied.'}, 404
+
+        limit = _page_size()
+        query = PipelineRunRecord.query.filter(PipelineRunRecord.pipeline_id == pipeline_id)
+        cursor = request.args.get('cursor')
+        if cursor:
+            # Cursors are "<started_at iso>_<id>" of the last row on the previous page.
+            try:
+                started_at, run_id = cursor.rsplit('_', 1)
+                started_at, run_id = datetime.fromisoformat(started_at), int(run_id)
+            except ValueError:
+                return {'status': 'error', 'message': 'Invalid cursor.'}, 400
+            query = query.filter(or_(PipelineRunRecord.started_at < started_at,
+                                     and_(PipelineRunRecord.started_at == started_at, PipelineRunRecord.id < run_id)))
+        # The (pipeline_id, started_at, id) index serves both the filter and the ordering.
+        runs = query.order_by(PipelineRunRecord.started_at.desc(), PipelineRunRecord.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(runs) > limit:
+            runs = runs[:limit]
+            next_cursor = f"{runs[-1].started_at.isoformat()}_{runs[-1].id}"
+        return {'items': [_serialize_run(r) for r in runs], 'next_cursor': next_cursor}
+
+@pipelines_ns.route('/runs/<int:run_id>')
+class PipelineRunDetail(Resource):
+    """Retrieves a single run and its step results."""
+
+    @login_required
+    def get(self, run_id):
+        """
+        Get a run with its steps in execution order.
+        Steps are paginated with `?after=<step id>`; `next_cursor` is set when more remain.
+        """
+        run = db.session.get(PipelineRunRecord, run_id)
+        if not run or run.pipeline.group_id != current_user.group_id:
+            return {'status': 'error', 'message': 'Run not found or access denied.'}, 404
+
+        limit = _page_size()
+        steps_query = run.steps
+        after = request.args.get('after', type=int)
+        if after:
+            steps_query = steps_query.filter(StepResult.id > after)
+        steps = steps_query.order_by(StepResult.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(steps) > limit:
+            steps = steps[:limit]
+            next_cursor = steps[-1].id
+        return {**_serialize_run(run), 'steps': [_serialize_step(s) for s in steps], 'next_cursor': next_cursor}
@@ -2,65 +2,277 @@
 import os
 import shlex
 import json
-import paramiko
+import socket
+import time
 import subprocess
 import tempfile
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
-from models import db, Pipeline, SSHHost, SavedScript
-from github import Github, UnknownObjectException
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from models import db, Pipeline, SSHHost, SavedScript, StepResult, PipelineRun as PipelineRunRecord, utcnow
+from ssh_pool import ssh_pool
+from output_stream import ChunkEmitter, stream_command, DEFAULT_MAX_RATE
+from output_store import output_captures, get_output_store
+from output_reducer import reduce_output
+from github_cache import github_cache
+from config_service import load_config
+from notifications import notification_dispatcher
+from analysis import analysis_service, analysis_text, wait_timeout
+
+DEFAULT_PIPELINE_MAX_PARALLEL = 4
+# Wall-clock limit for one script step, connecting to its host included.
+DEFAULT_PIPELINE_STEP_TIMEOUT = 1800
+DEFAULT_LOG_FLUSH_INTERVAL = 0.25
+EDGE_TYPES = ('success', 'failure')
+
+def run_room(run_id):
+    """Socket.IO room that receives the logs of a single pipeline run."""
+    return f"pipeline-run-{run_id}"
+
+def pipeline_host_ids(pipeline):
+    """IDs of the hosts a pipeline's host nodes point at, used as job queue host keys."""
+    return [node['hostId'] for node in json.loads(pipeline.nodes) if node.get('type') == 'host' and node.get('hostId')]
+
+class LogBatcher:
+    """
+    Collects pipeline log lines and emits them to the run's room as one
+    `pipeline_log_batch` frame per flush interval. Consecutive output chunks
+    are merged into a single entry so chatty scripts don't flood the client.
+    """
+
+    def __init__(self, socketio, run_id, flush_interval=DEFAULT_LOG_FLUSH_INTERVAL):
+        self.socketio = socketio
+        self.run_id = run_id
+        self.flush_interval = flush_interval
+        self._entries = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._task = None
+
+    def start(self):
+        self._task = self.socketio.start_background_task(self._flush_loop)
+
+    def add(self, log_type, message):
+        with self._lock:
+            last = self._entries[-1] if self._entries else None
+            if log_type == 'output_chunk' and last and last['type'] == 'output_chunk':
+                last['message'] += message
+            else:
+                self._entries.append({'type': log_type, 'message': message})
+        if not self._task or self._stopped.is_set():
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if entries:
+            room = run_room(self.run_id) if self.run_id else None
+            self.socketio.emit('pipeline_log_batch', {'run_id': self.run_id, 'entries': entries}, to=room)
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stopped.is_set():
+            self.socketio.sleep(self.flush_interval)
+            self.flush()
 
 class PipelineRunner:
-    def __init__(self, pipeline_id, app, socketio, dry_run=False):
+    def __init__(self, pipeline_id, app, socketio, dry_run=False, run_id=None):
         self.pipeline_id = pipeline_id
         self.app = app
         self.socketio = socketio
         self.dry_run = dry_run
+        self.run_id = run_id
         self.pipeline = None
         self.nodes = {}
         self.edges = []
+        self.outgoing = {}
+        self.incoming = {}
         self.config = {}
+        self.failed_steps = 0
+        self._lock = threading.Lock()
+        # One Future per AI analysis step still waiting for its result to be stored.
+        self._pending_analyses = []
+        self.log_batcher = LogBatcher(socketio, run_id)
 
     def run(self):
         """Starts the pipeline execution within a Flask application context."""
         with self.app.app_context():
-            self.pipeline = db.session.get(Pipeline, self.pipeline_id)
-            if not self.pipeline:
-                self.emit_log("error", f"Pipeline {self.pipeline_id} not found.")
-                return
-
-            self.nodes = {node['id']: node for node in json.loads(self.pipeline.nodes)}
-            self.edges = json.loads(self.pipeline.edges)
-            self.config = self._load_config()
-            
-            self.emit_log("info", f"Starting pipeline: '{self.pipeline.name}'")
-            if self.dry_run:
-                self.emit_log("info", "*** DRY RUN MODE: No commands will be executed on remote hosts. ***")
+            status = 'error'
+            self.log_batcher.start()
+            try:
+                self._update_run(status='running')
+                status = self._run()
+            finally:
+                self._update_run(status=status, finished_at=utcnow())
+                self.log_batcher.add('finished', status)
+                self.log_batcher.stop()
+
+    def _run(self):
+        """Executes the pipeline and returns the final run status."""
+        self.pipeline = db.session.get(Pipeline, self.pipeline_id)
+        if not self.pipeline:
+            self.emit_log("error", f"Pipeline {self.pipeline_id} not found.")
+            return 'error'
+
+        self.nodes = {node['id']: node for node in json.loads(self.pipeline.nodes)}
+        self.edges = json.loads(self.pipeline.edges)
+        self.build_edge_index()
+        self.config = load_config()
+
+        self.emit_log("info", f"Starting pipeline: '{self.pipeline.name}'")
+        if self.dry_run:
+            self.emit_log("info", "*** DRY RUN MODE: No commands will be executed on remote hosts. ***")
+
+        start_nodes = self.find_start_nodes()
+        if not start_nodes:
+            self.emit_log("error", "Pipeline has no starting point (e.g., a Host node).")
+            return 'error'
+
+        if self.topological_order() is None:
+            self.emit_log("error", "Pipeline contains a cycle and cannot be executed.")
+            return 'error'
+
+        self.execute_graph(start_nodes)
+        self._wait_for_analyses()
+
+        self.emit_log("info", "Pipeline execution finished.")
+        return 'failed' if self.failed_steps else 'success'
+
+    def _update_run(self, **fields):
+        """Persists status changes on this run's history record, if one was created."""
+        if not self.run_id: return
+        run_record = db.session.get(PipelineRunRecord, self.run_id)
+        if not run_record: return
+        for key, value in fields.items():
+            setattr(run_record, key, value)
+        db.session.commit()
+
+    def _record_step(self, node, success, context, started_at):
+        if not self.run_id: return
+        if node.get('type') in ('script', 'reduce-output'):
+            output = context.get('last_output')
+        elif node.get('type') == 'ai-analysis':
+            output = context.get('ai_summary')
+        else:
+            output = None
+        step = StepResult(run_id=self.run_id, node_id=node.get('id'), node_name=node['name'], node_type=node.get('type') or '',
+                          status='success' if success else 'failed', started_at=started_at, finished_at=utcnow(),
+                          output_id=context.get('last_output_id') if node.get('type') == 'script' else None)
+        step.set_output(output)
+        db.session.add(step)
+        db.session.commit()
+        return step.id
+
+    def _follow_analysis(self, node, context, step_id):
+        """Logs an analysis that is still running once it finishes, and stores it on its step."""
+        future = context.get('ai_future') if node.get('type') == 'ai-analysis' else None
+        if not future: return
+        attached = Future()
+        with self._lock:
+            self._pending_analyses.append(attached)
+        future.add_done_callback(lambda f: self._attach_analysis(step_id, f, attached))
+
+    def _attach_analysis(self, step_id, future, attached):
+        """Runs on the analysis service's thread when the result is in."""
+        try:
+            text = analysis_text(future)
+            self.emit_log("output", text)
+            self.emit_log("success", "AI Analysis complete.")
+            if step_id is None: return
+            with self.app.app_context():
+                step = db.session.get(StepResult, step_id)
+                if step:
+                    step.set_output(text)
+                    db.session.commit()
+        except Exception as e:
+            self.emit_log("error", f"Failed to record AI analysis: {e}")
+        finally:
+            attached.set_result(None)
 
-            start_nodes = self.find_start_nodes()
-            if not start_nodes:
-                self.emit_log("error", "Pipeline has no starting point (e.g., a Host node).")
-                return
+    def _wait_for_analyses(self):
+        """Lets analyses still in flight land in the run's history before it is marked finished."""
+        with self._lock:
+            pending = [f for f in self._pending_analyses if not f.done()]
+        if not pending: return
+        self.emit_log("info", f"Waiting for {len(pending)} AI analysis result(s)...")
+        _, not_done = wait(pending, timeout=wait_timeout(self.config))
+        if not_done:
+            self.emit_log("error", f"{len(not_done)} AI analysis result(s) not ready; they will be added to the run history when they arrive.")
 
-            for start_node_id in start_nodes:
-                self.execute_from_node(start_node_id, {})
+    def execute_graph(self, start_nodes):
+        """
+        Runs the pipeline on a worker pool, each node at most once. A node is
+        submitted when every step leading into it has finished or been skipped,
+        so independent branches run side by side and a join waits for all of
+        its branches. It runs if at least one of those steps ended with the
+        outcome its edge asks for, starting from their contexts merged in edge
+        order; otherwise it is skipped, and so is everything only it leads to.
+        """
+        waiting = {node_id: 0 for node_id in self.nodes}
+        for edge in self.edges:
+            if edge['to'] in waiting and edge['from'] in self.nodes:
+                waiting[edge['to']] += 1
+        edge_order = {id(edge): index for index, edge in enumerate(self.edges)}
+        inputs = defaultdict(list)
+        max_workers = max(1, int(self.config.get('PIPELINE_MAX_PARALLEL', DEFAULT_PIPELINE_MAX_PARALLEL)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(self.execute_node, node_id, {}) for node_id in start_nodes}
 
-            self.emit_log("info", "Pipeline execution finished.")
+            def resolve(node_id, outcome, context):
+                # outcome is 'success', 'failure', or None for a skipped node.
+                resolved = [(node_id, outcome, context)]
+                while resolved:
+                    node_id, outcome, context = resolved.pop()
+                    for edge_type in EDGE_TYPES:
+                        for edge in self.outgoing.get((node_id, edge_type), []):
+                            child = edge['to']
+                            if child not in waiting: continue
+                            if outcome == edge_type:
+                                inputs[child].append((edge_order[id(edge)], context))
+                            waiting[child] -= 1
+                            if waiting[child]: continue
+                            if inputs[child]:
+                                merged = {}
+                                for _, parent_context in sorted(inputs.pop(child), key=lambda item: item[0]):
+                                    merged.update(parent_context)
+                                pending.add(executor.submit(self.execute_node, child, merged))
+                            else:
+                                resolved.append((child, None, None))
 
-    def execute_from_node(self, node_id, context):
-        """Recursively executes nodes in the pipeline, passing context between them."""
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    node_id, success, context = future.result()
+                    resolve(node_id, None if success is None else 'success' if success else 'failure', context)
+
+    def execute_node(self, node_id, context):
+        """Executes a single node in its own app context and reports its outcome."""
         node = self.nodes.get(node_id)
-        if not node: return
+        if not node: return node_id, None, context
 
-        self.emit_log("info", f"Executing step: {node['name']}")
-        
-        success, new_context = self.execute_step(node, context)
-        
-        next_edges = self.find_next_edges(node_id, 'success' if success else 'failure')
-        for edge in next_edges:
-            self.execute_from_node(edge['to'], new_context)
+        with self.app.app_context():
+            self.emit_log("info", f"Executing step: {node['name']}")
+            started_at = utcnow()
+            try:
+                success, new_context = self.execute_step(node, context)
+            except Exception as e:
+                self.emit_log("error", f"Step '{node['name']}' failed: {e}")
+                success, new_context = False, context
+            if not success:
+                with self._lock:
+                    self.failed_steps += 1
+            step_id = None
+            try:
+                step_id = self._record_step(node, success, new_context, started_at)
+            except Exception as e:
+                db.session.rollback()
+                self.emit_log("error", f"Failed to record step '{node['name']}': {e}")
+            self._follow_analysis(node, new_context, step_id)
+        return node_id, success, new_context
 
     def execute_step(self, node, context):
         """Dispatches execution based on node type and updates the context."""
@@ -76,12 +288,16 @@ class PipelineRunner:
         if node_type == 'ai-analysis':
             return self._execute_ai_analysis(node, context)
 
+        if node_type == 'reduce-output':
+            return self._execute_reduce_output(node, context)
+
         if node_type in ['discord', 'email']:
             return self._execute_notification(node, context)
 
         return True, context
 
     def _execute_script(self, node, context):
+        context['last_output_id'] = None
         host_node = context.get('current_host_node')
         if not host_node:
             self.emit_log("error", f"No host context found for script: {node['name']}")
@@ -119,9 +335,14 @@ class PipelineRunner:
             context['last_output'] = f"[DRY RUN] Output of {node['name']}:\n{script_content}"
             return True, context
 
+        # Output beyond the head/tail caps is spilled to the output store; the step records its id.
+        captures = output_captures(self.config, get_output_store(self.config), self.pipeline.group_id, f"{self.pipeline.name}/{node['name']}")
+        timeout = float(self.config.get('PIPELINE_STEP_TIMEOUT', DEFAULT_PIPELINE_STEP_TIMEOUT))
+        deadline = time.monotonic() + timeout if timeout else None
         try:
             host_details = db.session.get(SSHHost, int(host_node['hostId']))
             output, error = "", ""
+            streamed = False
             
             if script_type == 'ansible-playbook':
                 with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.yml') as playbook_file:
@@ -131,30 +352,38 @@ class PipelineRunner:
                     inventory_file.write(f"[{host_details.friendly_name}]\n{host_details.hostname} ansible_user={host_details.username}\n")
                     inventory_path = inventory_file.name
                 ansible_command = ['ansible-playbook', '-i', inventory_path, playbook_path]
-                process = subprocess.run(ansible_command, capture_output=True, text=True)
-                output, error = process.stdout, process.stderr
-                os.unlink(playbook_path)
-                os.unlink(inventory_path)
+                try:
+                    process = subprocess.run(ansible_command, capture_output=True, text=True, timeout=timeout or None)
+                finally:
+                    os.unlink(playbook_path)
+                    os.unlink(inventory_path)
+                for stream, text in (('stdout', process.stdout), ('stderr', process.stderr)):
+                    captures[stream].write(text)
+                    captures[stream].close()
+                output, error = captures['stdout'].getvalue(), captures['stderr'].getvalue()
                 if error and process.returncode != 0:
                     raise Exception(error)
             else:
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                ssh.connect(host_details.hostname, username=host_details.username, timeout=10)
                 exec_command = f"python3 -c {shlex.quote(script_content)}" if script_type == 'python-script' else script_content
-                _, stdout, stderr = ssh.exec_command(exec_command)
-                output, error = stdout.read().decode(), stderr.read().decode()
-                ssh.close()
+                _, stdout, _ = ssh_pool.exec_command(host_details.hostname, host_details.username, exec_command,
+                                                     timeout=max(deadline - time.monotonic(), 0.001) if deadline else None)
+                emitter = ChunkEmitter(lambda stream, data: self.emit_log("output_chunk", data), sleep=self.socketio.sleep,
+                                       max_rate=int(self.config.get('STREAM_MAX_RATE', DEFAULT_MAX_RATE)))
+                output, error, _ = stream_command(stdout, on_chunk=emitter, captures=captures, deadline=deadline)
                 if error:
                     raise Exception(error)
+                streamed = True
 
             context['last_output'] = output
-            self.emit_log("output", output)
+            context['last_output_id'] = captures['stdout'].output_id
+            if not streamed:
+                self.emit_log("output", output)
             self.emit_log("success", f"Step '{node['name']}' completed successfully.")
             return True, context
 
         except Exception as e:
-            error_message = str(e)
+            timed_out = isinstance(e, (subprocess.TimeoutExpired, socket.timeout))
+            error_message = f"Step '{node['name']}' timed out after {timeout:g}s." if timed_out else str(e)
             self.emit_log("error", error_message)
             context['last_output'] = error_message
             return False, context
@@ -163,22 +392,49 @@ class PipelineRunner:
         self.emit_log("info", "Performing AI Analysis...")
         last_output = context.get('last_output', 'No previous output to analyze.')
         
+        context['ai_future'] = None
         if self.dry_run:
-            analysis = "[DRY RUN] AI analysis would be performed on the previous step's output."
+            context['ai_summary'] = "[DRY RUN] AI analysis would be performed on the previous step's output."
         else:
-            analysis = self._get_gemini_analysis(last_output)
-        
-        context['ai_summary'] = analysis
-        self.emit_log("output", analysis)
+            # The analysis runs on the analysis service; the following steps don't wait for it.
+            # Notification steps pick it up from the Future, and _record_step attaches it to this step.
+            if context.get('last_output_id'):
+                last_output = self._reduced_output(context)
+            future = analysis_service.submit(self.config, last_output)
+            context['ai_future'] = None if future.done() else future
+            if context['ai_future']:
+                context['ai_summary'] = "AI analysis in progress..."
+                self.emit_log("info", "AI analysis running in the background; continuing with the next steps.")
+                return True, context
+            context['ai_summary'] = analysis_text(future)
+
+        self.emit_log("output", context['ai_summary'])
         self.emit_log("success", "AI Analysis complete.")
         return True, context
 
+    def _reduced_output(self, context):
+        """The previous step's output reduced to REDUCE_MAX_TOKENS, read in full from the output store if it was spilled."""
+        return reduce_output(self.config, context.get('last_output'), get_output_store(self.config), context.get('last_output_id'))
+
+    def _execute_reduce_output(self, node, context):
+        output = context.get('last_output') or ''
+        reduced = self._reduced_output(context)
+        if reduced != output or context.get('last_output_id'):
+            self.emit_log("info", f"Reduced the previous output to {len(reduced)} characters.")
+        # Later steps (AI analysis, notifications) see the reduced text in place of the output.
+        context['last_output'], context['last_output_id'] = reduced, None
+        self.emit_log("output", reduced)
+        self.emit_log("success", f"Step '{node['name']}' completed successfully.")
+        return True, context
+
     def _execute_notification(self, node, context):
         self.emit_log("info", f"Sending notification via {node['type']}...")
         if self.dry_run:
             self.emit_log("success", f"[DRY RUN] Notification '{node['name']}' would be sent.")
             return True, context
         
+        if context.get('ai_future'):
+            context['ai_summary'] = analysis_text(context['ai_future'], wait_timeout(self.config))
         if node['type'] == 'discord':
             self._send_discord_notification(context)
         elif node['type'] == 'email':
@@ -187,87 +443,77 @@ class PipelineRunner:
         return True, context
 
     def _get_github_script_content(self, path):
-        g = Github(self.config.get('GITHUB_PAT'))
-        repo = g.get_repo(self.config.get('GITHUB_REPO'))
-        file_content = repo.get_contents(path)
-        return file_content.decoded_content.decode('utf-8')
-
-    def _get_gemini_analysis(self, output):
-        api_key = self.config.get('GEMINI_API_KEY')
-        if not api_key: return "Gemini API key not configured."
-        try:
-            prompt = f"As an expert DevOps engineer, analyze the following command line output. Provide a concise summary and potential troubleshooting steps in Markdown.\n\nOutput:\n---\n{output}\n---"
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={api_key}"
-            response = requests.post(api_url, json={"contents": [{"parts": [{"text": prompt}]}]}, headers={'Content-Type': 'application/json'})
-            response.raise_for_status()
-            return response.json()['candidates'][0]['content']['parts'][0]['text']
-        except Exception as e:
-            return f"AI analysis failed: {e}"
+        return github_cache.get_file(self.config, path)
+
+    def _notification_logger(self):
+        """Reports delivery results from the dispatcher thread back into this run's log."""
+        return lambda ok, message: self.emit_log("success" if ok else "error", message)
 
     def _send_discord_notification(self, context):
-        webhook_url = self.config.get('DISCORD_WEBHOOK_URL')
-        if not webhook_url: return
         embed = {"title": f"Pipeline Report: {self.pipeline.name}", "description": f"Report from pipeline run.", "fields": []}
         if context.get('ai_summary'):
             embed['fields'].append({"name": "AI Summary", "value": context['ai_summary'][:1024]})
         if context.get('last_output'):
             embed['fields'].append({"name": "Last Step Output", "value": f"```\n{context['last_output'][:1000]}\n```"})
-        try:
-            requests.post(webhook_url, json={"embeds": [embed]})
-            self.emit_log("success", "Discord notification sent.")
-        except Exception as e:
-            self.emit_log("error", f"Failed to send Discord notification: {e}")
+        if notification_dispatcher.send_discord(self.config, embed, on_result=self._notification_logger()):
+            self.emit_log("info", "Discord notification queued.")
 
     def _send_email_notification(self, context):
-        smtp_settings = ['EMAIL_TO', 'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USER', 'SMTP_PASSWORD']
-        if not all(self.config.get(key) for key in smtp_settings):
+        html_body = f"<html><body><h2>Report for {self.pipeline.name}</h2><p>AI Summary: {context.get('ai_summary', 'N/A')}</p><p>Last Output:</p><pre>{context.get('last_output', 'N/A')}</pre></body></html>"
+        if notification_dispatcher.send_email(self.config, f"Pipeline Report: {self.pipeline.name}", html_body, on_result=self._notification_logger()):
+            self.emit_log("info", f"Email notification queued for {self.config['EMAIL_TO']}")
+        else:
             self.emit_log("error", "SMTP settings incomplete. Cannot send email.")
-            return
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = self.config['SMTP_USER']
-            msg['To'] = self.config['EMAIL_TO']
-            msg['Subject'] = f"Pipeline Report: {self.pipeline.name}"
-            html_body = f"<html><body><h2>Report for {self.pipeline.name}</h2><p>AI Summary: {context.get('ai_summary', 'N/A')}</p><p>Last Output:</p><pre>{context.get('last_output', 'N/A')}</pre></body></html>"
-            msg.attach(MIMEText(html_body, 'html'))
-            server = smtplib.SMTP(self.config['SMTP_SERVER'], int(self.config['SMTP_PORT']))
-            server.starttls()
-            server.login(self.config['SMTP_USER'], self.config['SMTP_PASSWORD'])
-            server.send_message(msg)
-            server.quit()
-            self.emit_log("success", f"Email notification sent to {self.config['EMAIL_TO']}")
-        except Exception as e:
-            self.emit_log("error", f"Failed to send email: {e}")
 
-    def _load_config(self):
-        config_path = os.path.join(self.app.root_path, 'config.json')
-        if not os.path.exists(config_path): return {}
-        with open(config_path, 'r') as f: return json.load(f)
+    def build_edge_index(self):
+        """Indexes edges by (node_id, edge type) in both directions so lookups don't rescan self.edges."""
+        self.outgoing, self.incoming = defaultdict(list), defaultdict(list)
+        for edge in self.edges:
+            self.outgoing[(edge['from'], edge['type'])].append(edge)
+            self.incoming[(edge['to'], edge['type'])].append(edge)
+
+    def topological_order(self):
+        """Returns node ids in dependency order (Kahn's algorithm), or None if the graph has a cycle."""
+        in_degree = {node_id: 0 for node_id in self.nodes}
+        for edge in self.edges:
+            if edge['to'] in in_degree and edge['from'] in self.nodes:
+                in_degree[edge['to']] += 1
+        ready = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for edge_type in EDGE_TYPES:
+                for edge in self.outgoing.get((node_id, edge_type), []):
+                    if edge['to'] in in_degree:
+                        in_degree[edge['to']] -= 1
+                        if in_degree[edge['to']] == 0:
+                            ready.append(edge['to'])
+        return order if len(order) == len(self.nodes) else None
 
     def find_start_nodes(self):
-        all_to_nodes = {edge['to'] for edge in self.edges}
-        return [node_id for node_id in self.nodes if node_id not in all_to_nodes]
+        return [node_id for node_id in self.nodes if not any(self.incoming.get((node_id, edge_type)) for edge_type in EDGE_TYPES)]
 
     def find_next_edges(self, node_id, outcome_type):
-        return [edge for edge in self.edges if edge['from'] == node_id and edge['type'] == outcome_type]
+        return self.outgoing.get((node_id, outcome_type), [])
 
     def find_host_for_script(self, script_node_id):
         processed_nodes = set()
-        to_process = [script_node_id]
+        to_process = deque([script_node_id])
         while to_process:
-            current_id = to_process.pop(0)
+            current_id = to_process.popleft()
             if current_id in processed_nodes: continue
             processed_nodes.add(current_id)
-            
-            incoming_edges = [e for e in self.edges if e['to'] == current_id]
-            for edge in incoming_edges:
-                prev_node = self.nodes.get(edge['from'])
-                if prev_node:
-                    if prev_node['type'] == 'host':
-                        return prev_node
-                    else:
-                        to_process.append(prev_node['id'])
+
+            for edge_type in EDGE_TYPES:
+                for edge in self.incoming.get((current_id, edge_type), []):
+                    prev_node = self.nodes.get(edge['from'])
+                    if prev_node:
+                        if prev_node['type'] == 'host':
+                            return prev_node
+                        else:
+                            to_process.append(prev_node['id'])
         return None
 
     def emit_log(self, log_type, message):
-        self.socketio.emit('pipeline_log', {'type': log_type, 'message': message})
+        self.log_batcher.add(log_type, message)
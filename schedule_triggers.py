@@ -0,0 +1,41 @@
+# schedule_triggers.py
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+# --- Schedule Triggers ---
+# Turns the trigger columns of a Schedule into an APScheduler trigger. Shared by
+# the web app (to validate input) and the scheduler (to build jobs).
+
+TRIGGER_TYPES = ('daily', 'cron', 'interval')
+MIN_INTERVAL_SECONDS = 10
+MAX_JITTER_SECONDS = 3600
+
+def build_trigger(trigger_type, hour=None, minute=None, cron_expression=None, interval_seconds=None, jitter_seconds=None):
+    """Returns an APScheduler trigger, or raises ValueError describing what's wrong."""
+    if jitter_seconds is not None and not (0 <= int(jitter_seconds) <= MAX_JITTER_SECONDS):
+        raise ValueError(f"Jitter must be between 0 and {MAX_JITTER_SECONDS} seconds.")
+    # APScheduler delays each fire time by a random 0..jitter seconds.
+    jitter = int(jitter_seconds) if jitter_seconds else None
+    if trigger_type == 'daily':
+        if hour is None or minute is None or not (0 <= int(hour) <= 23 and 0 <= int(minute) <= 59):
+            raise ValueError("Hour must be 0-23 and minute 0-59.")
+        return CronTrigger(hour=int(hour), minute=int(minute), jitter=jitter)
+    if trigger_type == 'cron':
+        if not cron_expression or len(cron_expression.split()) != 5:
+            raise ValueError("Cron expression must have five fields: minute hour day month day-of-week.")
+        minute_field, hour_field, day, month, day_of_week = cron_expression.split()
+        return CronTrigger(minute=minute_field, hour=hour_field, day=day, month=month, day_of_week=day_of_week, jitter=jitter)
+    if trigger_type == 'interval':
+        if not interval_seconds or int(interval_seconds) < MIN_INTERVAL_SECONDS:
+            raise ValueError(f"Interval must be at least {MIN_INTERVAL_SECONDS} seconds.")
+        return IntervalTrigger(seconds=int(interval_seconds), jitter=jitter)
+    raise ValueError(f"Unknown trigger type '{trigger_type}'. Use one of: {', '.join(TRIGGER_TYPES)}.")
+
+def describe_trigger(trigger_type, hour=None, minute=None, cron_expression=None, interval_seconds=None, jitter_seconds=None):
+    if trigger_type == 'cron':
+        description = f"cron '{cron_expression}'"
+    elif trigger_type == 'interval':
+        description = f"every {interval_seconds}s"
+    else:
+        description = f"daily at {int(hour or 0):02d}:{int(minute or 0):02d}"
+    return f"{description} (+ up to {jitter_seconds}s)" if jitter_seconds else description
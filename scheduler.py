@@ -2,117 +2,297 @@
 import os
 import shlex
 import json
-import requests
-import paramiko
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import signal
+import threading
+import time
+import socket
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.executors.pool import ThreadPoolExecutor as JobExecutor
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from models import db, SSHHost, SavedScript, Schedule
+from flask_socketio import SocketIO
+from models import db, SSHHost, Schedule, PipelineRun, get_revision, acquire_lease, release_lease
+from schedule_triggers import build_trigger
+from run_pipeline import PipelineRunner, pipeline_host_ids
+from job_queue import get_job_queue
+from ssh_pool import ssh_pool
+from config_service import load_config
+from database import configure_app, engine_options, migrate_database
+from output_stream import stream_command
+from output_store import output_captures
+from notifications import notification_dispatcher
+from analysis import analysis_service, analysis_text
+from scheduler_health import SchedulerMetrics, start_health_server, DEFAULT_HEALTH_HOST, DEFAULT_HEALTH_PORT
 
 # This setup mirrors app.py to allow database access
-basedir = os.path.abspath(os.path.dirname(__file__))
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'app.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+configure_app(app)
+# Pipeline logs reach browsers only when the web app shares SOCKETIO_MESSAGE_QUEUE.
+socketio = SocketIO(app, message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
 
 # --- Helper Functions ---
-CONFIG_FILE = os.path.join(basedir, 'config.json')
-
-def load_config():
-    if not os.path.exists(CONFIG_FILE): return {}
-    with open(CONFIG_FILE, 'r') as f: return json.load(f)
-
-def get_gemini_analysis(output, api_key):
-    if not api_key: return "Gemini API key not configured."
-    try:
-        prompt = f"As an expert DevOps engineer, analyze the following command line output. Provide a concise summary and potential troubleshooting steps in Markdown.\n\nOutput:\n---\n{output}\n---"
-        api_url = f"[https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key=](https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key=){api_key}"
-        response = requests.post(api_url, json={"contents": [{"parts": [{"text": prompt}]}]}, headers={'Content-Type': 'application/json'})
-        response.raise_for_status()
-        return response.json()['candidates'][0]['content']['parts'][0]['text']
-    except Exception as e:
-        return f"AI analysis failed: {e}"
-
 def send_discord_notification(schedule_name, host_name, script_name, output, error, analysis):
-    config = load_config()
-    webhook_url = config.get('DISCORD_WEBHOOK_URL')
-    if not webhook_url: return
     embed = {"title": f"Scheduled Task Report: {schedule_name}", "description": f"Ran **{script_name}** on **{host_name}**", "color": 5814783 if not error else 15158332, "fields": [{"name": "AI Summary", "value": analysis[:1024]}, {"name": "Output", "value": f"```\n{output[:1000]}\n```" if output else "No output."}]}
     if error: embed["fields"].append({"name": "Error", "value": f"```\n{error[:1000]}\n```"})
-    try:
-        requests.post(webhook_url, json={"embeds": [embed]})
-    except Exception as e:
-        print(f"Failed to send Discord notification: {e}")
+    notification_dispatcher.send_discord(load_config(), embed)
 
 def send_email_notification(schedule_name, host_name, script_name, output, error, analysis):
-    config = load_config()
-    smtp_settings = ['EMAIL_TO', 'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USER', 'SMTP_PASSWORD']
-    if not all(config.get(key) for key in smtp_settings):
+    analysis_html = analysis.replace('`', '<code>').replace('\n', '<br>')
+    error_html = f'''<h3>Error</h3><pre style="background-color: #fdd; color: #c00; padding: 10px; border-radius: 5px;">{error}</pre>''' if error else ''
+    html_body = f"""<html><body style="font-family: sans-serif; color: #333;"><h2>Pipeline Report: {schedule_name}</h2><p>Ran script <strong>{script_name}</strong> on host <strong>{host_name}</strong>.</p><hr><h3>AI Summary</h3><div style="background-color: #f5f5f5; padding: 10px; border-radius: 5px;">{analysis_html}</div><h3>Output</h3><pre style="background-color: #222; color: #eee; padding: 10px; border-radius: 5px;">{output or "No output."}</pre>{error_html}</body></html>"""
+    if not notification_dispatcher.send_email(load_config(), f"Pipeline Report: {schedule_name}", html_body):
         print("SMTP settings are incomplete. Skipping email notification.")
-        return
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = config['SMTP_USER']
-        msg['To'] = config['EMAIL_TO']
-        msg['Subject'] = f"Pipeline Report: {schedule_name}"
-        html_body = f"""<html><body style="font-family: sans-serif; color: #333;"><h2>Pipeline Report: {schedule_name}</h2><p>Ran script <strong>{script_name}</strong> on host <strong>{host_name}</strong>.</p><hr><h3>AI Summary</h3><div style="background-color: #f5f5f5; padding: 10px; border-radius: 5px;">{analysis.replace('`', '<code>').replace('\n', '<br>')}</div><h3>Output</h3><pre style="background-color: #222; color: #eee; padding: 10px; border-radius: 5px;">{output or "No output."}</pre>{f'''<h3>Error</h3><pre style="background-color: #fdd; color: #c00; padding: 10px; border-radius: 5px;">{error}</pre>''' if error else ''}</body></html>"""
-        msg.attach(MIMEText(html_body, 'html'))
-        server = smtplib.SMTP(config['SMTP_SERVER'], int(config['SMTP_PORT']))
-        server.starttls()
-        server.login(config['SMTP_USER'], config['SMTP_PASSWORD'])
-        server.send_message(msg)
-        server.quit()
-        print(f"Successfully sent email notification to {config['EMAIL_TO']}")
-    except Exception as e:
-        print(f"Failed to send email notification: {e}")
 
 def run_scheduled_task(schedule_id):
+    metrics.run_started()
+    started, ok = time.monotonic(), False
+    try:
+        ok = _run_scheduled_task(schedule_id)
+    finally:
+        metrics.run_finished(time.monotonic() - started, ok)
+
+class RunSlots:
+    """
+    Caps how many host executions scheduled jobs run at once, overall and per
+    host. Slots are always taken in the same order (hosts by key, then the
+    global slot last), so a pipeline holding several hosts can't deadlock with
+    other runs, and a run waiting on a busy host never holds a global slot.
+    """
+
+    def __init__(self, max_total, max_per_host):
+        self._total = threading.BoundedSemaphore(max_total)
+        self._hosts = defaultdict(lambda: threading.BoundedSemaphore(max_per_host))
+        self._lock = threading.Lock()
+
+    def acquire(self, host_keys):
+        with self._lock:
+            semaphores = [self._hosts[key] for key in sorted({str(k) for k in host_keys})]
+        for semaphore in semaphores:
+            semaphore.acquire()
+        self._total.acquire()
+        return semaphores
+
+    def release(self, semaphores):
+        self._total.release()
+        for semaphore in reversed(semaphores):
+            semaphore.release()
+
+def _run_scheduled_task(schedule_id):
     with app.app_context():
         schedule = db.session.get(Schedule, schedule_id)
-        if not schedule: return
-        host, script = schedule.host, schedule.script
+        if not schedule: return False
         print(f"Running scheduled task '{schedule.name}'")
-        exec_command = f"python3 -c {shlex.quote(script.content)}" if script.script_type == 'python-script' else script.content
-        output, error = "", ""
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(host.hostname, username=host.username, timeout=10)
-            _, stdout, stderr = ssh.exec_command(exec_command)
-            output, error = stdout.read().decode(), stderr.read().decode()
-            ssh.close()
-        except Exception as e:
-            error = f"Execution failed: {e}"
-        config = load_config()
-        analysis = get_gemini_analysis(output or error, config.get('GEMINI_API_KEY'))
-        send_discord_notification(schedule.name, host.friendly_name, script.name, output, error, analysis)
-        send_email_notification(schedule.name, host.friendly_name, script.name, output, error, analysis)
+        if schedule.pipeline_id:
+            return _run_scheduled_pipeline(schedule)
+        hosts = SSHHost.query.filter(SSHHost.id.in_(schedule.target_host_ids())).all()
+        script = schedule.script
+        if not hosts or not script:
+            print(f"Schedule '{schedule.name}' has no host or script left; skipping.")
+            return False
+        # Copy plain values out of the session before handing them to other threads.
+        targets = [(h.id, h.hostname, h.username, h.friendly_name) for h in hosts]
+        script_info = (script.name, script.script_type, script.content)
+        name = schedule.name
+    # RunSlots does the real limiting; the pool only needs to be large enough not to add its own.
+    with ThreadPoolExecutor(max_workers=min(len(targets), max_concurrent_runs)) as executor:
+        results = list(executor.map(lambda target: _run_script_on_host(name, target, script_info), targets))
+    return all(results)
+
+def _run_script_on_host(schedule_name, target, script_info):
+    host_id, hostname, username, host_name = target
+    script_name, script_type, content = script_info
+    exec_command = f"python3 -c {shlex.quote(content)}" if script_type == 'python-script' else content
+    output, error = "", ""
+    slots = run_slots.acquire([host_id])
+    try:
+        _, stdout, _ = ssh_pool.exec_command(hostname, username, exec_command)
+        # Reports only carry the head and tail of the output; nothing is spilled to disk.
+        output, error, _ = stream_command(stdout, captures=output_captures(load_config()))
+    except Exception as e:
+        error = f"Execution failed: {e}"
+    finally:
+        run_slots.release(slots)
+    # The reports go out once the analysis is ready; the job (and its run slot) doesn't wait for it.
+    def notify(future):
+        analysis = analysis_text(future)
+        send_discord_notification(schedule_name, host_name, script_name, output, error, analysis)
+        send_email_notification(schedule_name, host_name, script_name, output, error, analysis)
+    analysis_service.submit(load_config(), output or error).add_done_callback(notify)
+    return not error
+
+def _run_scheduled_pipeline(schedule):
+    pipeline = schedule.pipeline
+    if not pipeline:
+        print(f"Schedule '{schedule.name}' points at a deleted pipeline; skipping.")
+        return False
+    run_record = PipelineRun(pipeline_id=pipeline.id, status='queued', triggered_by=f"schedule:{schedule.name}")
+    db.session.add(run_record)
+    db.session.commit()
+    queue = get_job_queue(load_config())
+    if queue:
+        # Workers spread scheduled pipelines across processes like manually started ones.
+        queue.enqueue('pipeline', {'pipeline_id': pipeline.id, 'dry_run': False, 'run_id': run_record.id},
+                      group_id=pipeline.group_id, host_keys=pipeline_host_ids(pipeline))
+        return True
+    # Pipelines run on their own pool, so a long one ties up neither a job executor thread nor a run slot.
+    pipeline_executor.submit(_run_pipeline, pipeline.id, run_record.id)
+    return True
+
+def _run_pipeline(pipeline_id, run_id):
+    try:
+        PipelineRunner(pipeline_id, app, socketio, run_id=run_id).run()
+    except Exception as e:
+        print(f"Scheduled pipeline run {run_id} failed: {e}")
 
 # --- Scheduler Setup ---
-scheduler = BackgroundScheduler(daemon=True)
+# Jobs live in the application database so next run times survive restarts and
+# a newly elected leader carries on where the previous one stopped. Only the
+# process holding the 'scheduler' lease runs jobs; other replicas stay paused
+# as hot standbys and take over when the lease expires.
+DEFAULT_SYNC_INTERVAL = 10
+DEFAULT_LEASE_SECONDS = 30
+DEFAULT_MISFIRE_GRACE = 300
+DEFAULT_EXECUTOR_SIZE = 10
+DEFAULT_MAX_CONCURRENT_RUNS = 10
+DEFAULT_MAX_PER_HOST = 2
+DEFAULT_MAX_CONCURRENT_PIPELINES = 4
+LEASE_NAME = 'scheduler'
+
+config = load_config()
+# Jobs beyond the executor size wait for a free thread (see queue_depth in /metrics)
+# instead of all starting at once when many schedules share a fire time.
+scheduler = BackgroundScheduler(
+    daemon=True,
+    jobstores={'default': SQLAlchemyJobStore(url=app.config['SQLALCHEMY_DATABASE_URI'], tablename='apscheduler_jobs',
+                                             engine_options=engine_options(app.config['SQLALCHEMY_DATABASE_URI']))},
+    executors={'default': JobExecutor(int(config.get('SCHEDULER_EXECUTOR_SIZE', DEFAULT_EXECUTOR_SIZE)))},
+    job_defaults={'coalesce': True, 'misfire_grace_time': int(config.get('SCHEDULER_MISFIRE_GRACE', DEFAULT_MISFIRE_GRACE))})
+max_concurrent_runs = int(config.get('SCHEDULER_MAX_CONCURRENT_RUNS', DEFAULT_MAX_CONCURRENT_RUNS))
+run_slots = RunSlots(max_concurrent_runs, int(config.get('SCHEDULER_MAX_PER_HOST', DEFAULT_MAX_PER_HOST)))
+# Scheduled pipelines beyond this many wait in the pool's queue.
+pipeline_executor = ThreadPoolExecutor(max_workers=int(config.get('SCHEDULER_MAX_CONCURRENT_PIPELINES', DEFAULT_MAX_CONCURRENT_PIPELINES)),
+                                       thread_name_prefix='scheduled-pipeline')
+metrics = SchedulerMetrics()
+metrics.attach(scheduler)
+stop_event = threading.Event()
+instance_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+# Trigger signature of every job we've scheduled, keyed by job id, and the
+# 'schedules' revision it was built from. Signatures are also stored as the
+# job name so a new leader can rebuild this map from the job store.
+job_signatures = {}
+synced_revision = None
 
-def load_schedules_from_db():
+TRIGGER_COLUMNS = ('trigger_type', 'hour', 'minute', 'cron_expression', 'interval_seconds', 'jitter_seconds')
+
+def load_job_signatures():
+    global synced_revision
+    job_signatures.clear()
+    job_signatures.update({job.id: job.name for job in scheduler.get_jobs()})
+    synced_revision = None
+
+def sync_schedules():
+    """
+    Reconciles scheduler jobs with the Schedule table. Only the 'schedules'
+    revision counter is read unless something changed; then one column-only
+    query is diffed against the jobs we already have, and only added,
+    edited or deleted schedules touch the scheduler.
+    """
+    global synced_revision
+    # Schedules without their own jitter use SCHEDULE_DEFAULT_JITTER, so a change to it also needs a resync.
+    default_jitter = int(load_config().get('SCHEDULE_DEFAULT_JITTER', 0)) or None
     with app.app_context():
-        schedules = Schedule.query.all()
-        print(f"Loading {len(schedules)} schedules from database...")
-        for schedule in schedules:
-            job_id = str(schedule.id)
-            if not scheduler.get_job(job_id):
-                scheduler.add_job(run_scheduled_task, 'cron', hour=schedule.hour, minute=schedule.minute, id=job_id, args=[schedule.id])
-        print("Scheduler jobs loaded.")
+        revision = (get_revision('schedules'), default_jitter)
+        if revision == synced_revision: return
+        rows = db.session.query(Schedule.id, *(getattr(Schedule, column) for column in TRIGGER_COLUMNS)).all()
+    desired = {str(row[0]): dict(zip(TRIGGER_COLUMNS, row[1:])) for row in rows}
+    for fields in desired.values():
+        if fields['jitter_seconds'] is None: fields['jitter_seconds'] = default_jitter
+    added = changed = removed = 0
+    for job_id in set(job_signatures) - set(desired):
+        if scheduler.get_job(job_id): scheduler.remove_job(job_id)
+        del job_signatures[job_id]
+        removed += 1
+    for job_id, fields in desired.items():
+        signature = json.dumps(fields, sort_keys=True)
+        current = job_signatures.get(job_id)
+        if current == signature: continue
+        try:
+            trigger = build_trigger(**fields)
+        except ValueError as e:
+            print(f"Schedule {job_id} has an invalid trigger and was not scheduled: {e}")
+            continue
+        if current is None or not scheduler.get_job(job_id):
+            scheduler.add_job(run_scheduled_task, trigger, id=job_id, name=signature, args=[int(job_id)], replace_existing=True)
+            added += 1
+        else:
+            scheduler.modify_job(job_id, name=signature)
+            scheduler.reschedule_job(job_id, trigger=trigger)
+            changed += 1
+        job_signatures[job_id] = signature
+    synced_revision = revision
+    print(f"Schedules synced (revision {revision[0]}): {added} added, {changed} changed, {removed} removed, {len(job_signatures)} active.")
+
+def request_stop(signum, frame):
+    print(f"Received signal {signum}; shutting down.")
+    stop_event.set()
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    load_schedules_from_db()
-    scheduler.start()
-    print("Scheduler started. Press Ctrl+C to exit.")
-    try:
-        while True:
-            pass
-    except (KeyboardInterrupt, SystemExit):
-        scheduler.shutdown()
+    migrate_database(app)
+    sync_interval = float(config.get('SCHEDULE_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
+    lease_seconds = float(config.get('SCHEDULER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+    # Wake often enough to renew the lease well before it expires.
+    tick = min(sync_interval, lease_seconds / 3)
+    scheduler.start(paused=True)
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    health_server = None
+    health_port = int(config.get('SCHEDULER_HEALTH_PORT', DEFAULT_HEALTH_PORT))
+    if health_port:
+        health_host = config.get('SCHEDULER_HEALTH_HOST', DEFAULT_HEALTH_HOST)
+        health_server = start_health_server(metrics, scheduler, health_host, health_port)
+        print(f"Health and metrics available at http://{health_host}:{health_port}/health and /metrics")
+    print(f"Scheduler {instance_id} started. Press Ctrl+C to exit.")
+    is_leader, last_sync = False, 0
+    # Sleep until SIGINT/SIGTERM, waking up to renew the lease and pick up schedule changes made in the web app.
+    while True:
+        try:
+            with app.app_context():
+                leader_now = acquire_lease(LEASE_NAME, instance_id, lease_seconds)
+            if leader_now and not is_leader:
+                print("Acquired scheduler lease; this instance is now running jobs.")
+                load_job_signatures()
+                sync_schedules()
+                last_sync = time.monotonic()
+                scheduler.resume()
+            elif not leader_now and is_leader:
+                print("Lost scheduler lease; pausing until it can be reacquired.")
+                scheduler.pause()
+            elif leader_now and time.monotonic() - last_sync >= sync_interval:
+                sync_schedules()
+                last_sync = time.monotonic()
+            is_leader = leader_now
+        except Exception as e:
+            print(f"Scheduler loop failed: {e}")
+            if is_leader:
+                # Without a renewed lease another replica may take over, so stop firing jobs.
+                scheduler.pause()
+                is_leader = False
+        if stop_event.wait(tick):
+            break
+    print("Waiting for running jobs to finish...")
+    scheduler.shutdown(wait=True)
+    pipeline_executor.shutdown(wait=True)
+    if is_leader:
+        with app.app_context():
+            release_lease(LEASE_NAME, instance_id)
+    if health_server:
+        health_server.shutdown()
+    # Pending analyses still send their reports through the dispatcher, so stop it last.
+    analysis_service.stop()
+    notification_dispatcher.stop()
+    ssh_pool.close_all()
+    print("Scheduler stopped.")
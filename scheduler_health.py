@@ -0,0 +1,107 @@
+# scheduler_health.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES
+
+# --- Scheduler Metrics & Health ---
+# Counters for the scheduler process, fed by APScheduler job events and by the
+# task itself, and served as JSON over a small HTTP endpoint:
+#   GET /health  -> 200 while the scheduler is running, 503 otherwise
+#   GET /metrics -> queue depth, running jobs, misfires and run durations
+
+DEFAULT_HEALTH_HOST = '127.0.0.1'
+DEFAULT_HEALTH_PORT = 5013
+RECENT_DURATIONS = 100
+
+class SchedulerMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.submitted = 0
+        self.started = 0
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.misfires = 0
+        self.skipped = 0
+        self.last_run_at = None
+        self._durations = []
+
+    def attach(self, scheduler):
+        scheduler.add_listener(self._on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    def _on_event(self, event):
+        with self._lock:
+            if event.code == EVENT_JOB_SUBMITTED:
+                self.submitted += 1
+            elif event.code == EVENT_JOB_MISSED:
+                self.misfires += 1
+            elif event.code == EVENT_JOB_MAX_INSTANCES:
+                self.skipped += 1
+
+    def run_started(self):
+        with self._lock:
+            self.started += 1
+            self.running += 1
+
+    def run_finished(self, duration, ok=True):
+        with self._lock:
+            self.running -= 1
+            if ok: self.succeeded += 1
+            else: self.failed += 1
+            self.last_run_at = time.time()
+            self._durations = (self._durations + [duration])[-RECENT_DURATIONS:]
+
+    def snapshot(self, scheduler=None):
+        with self._lock:
+            durations = sorted(self._durations)
+            data = {
+                'uptime': round(time.time() - self.started_at, 1),
+                # Jobs APScheduler has handed to its executor that haven't started yet.
+                'queue_depth': max(0, self.submitted - self.started),
+                'running': self.running,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'misfires': self.misfires,
+                'skipped_max_instances': self.skipped,
+                'last_run_at': self.last_run_at,
+                'run_duration': {
+                    'count': len(durations),
+                    'avg': round(sum(durations) / len(durations), 3) if durations else None,
+                    'p95': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3) if durations else None,
+                    'max': round(durations[-1], 3) if durations else None,
+                },
+            }
+        if scheduler is not None:
+            data['scheduled_jobs'] = len(scheduler.get_jobs())
+            data['scheduler_running'] = scheduler.running
+        return data
+
+def start_health_server(metrics, scheduler, host=DEFAULT_HEALTH_HOST, port=DEFAULT_HEALTH_PORT):
+    """Serves /health and /metrics from a daemon thread. Returns the server so it can be shut down."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                code = 200 if scheduler.running else 503
+                body = {'status': 'ok' if code == 200 else 'stopped'}
+            elif self.path == '/metrics':
+                code, body = 200, metrics.snapshot(scheduler)
+            else:
+                code, body = 404, {'status': 'error', 'message': 'Not found'}
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='scheduler-health', daemon=True).start()
+    return server
@@ -0,0 +1,122 @@
+# ssh_pool.py
+import threading
+import time
+import paramiko
+
+# --- Connection Pool ---
+# A process-wide cache of authenticated SSH transports. paramiko multiplexes
+# channels over a single transport, so every command on an already-connected
+# host only costs a channel open instead of a full handshake and auth.
+
+class _PooledConnection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+class SSHConnectionPool:
+    def __init__(self, keepalive=30, idle_timeout=300, connect_timeout=10):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._connections = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(hostname, username, port):
+        return (hostname, int(port or 22), username)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_client(self, hostname, username, port=22, password=None, connect_timeout=None):
+        """
+        Returns a connected SSHClient for the host, reusing a live transport when possible.
+        `connect_timeout` (default: the pool's) bounds the TCP connect, banner and auth of a new connection.
+        """
+        connect_timeout = self.connect_timeout if connect_timeout is None else min(connect_timeout, self.connect_timeout)
+        key = self._key(hostname, username, port)
+        self.evict_idle()
+        # The per-key lock stops concurrent callers from racing to open duplicate connections to one host.
+        with self._key_lock(key):
+            with self._lock:
+                conn = self._connections.get(key)
+            if conn and conn.is_alive():
+                conn.last_used = time.monotonic()
+                with self._lock:
+                    self.hits += 1
+                return conn.client
+            if conn:
+                self._close_quietly(conn)
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(hostname, port=int(port or 22), username=username, password=password,
+                           timeout=connect_timeout, banner_timeout=connect_timeout, auth_timeout=connect_timeout)
+            if self.keepalive:
+                client.get_transport().set_keepalive(self.keepalive)
+            with self._lock:
+                self._connections[key] = _PooledConnection(client)
+                self.misses += 1
+            return client
+
+    def exec_command(self, hostname, username, command, port=22, password=None, timeout=None):
+        """
+        Opens a new channel on a pooled connection and runs the command on it. `timeout`
+        also caps connecting and opening the channel, so a caller can pass its remaining time.
+        """
+        client = self.get_client(hostname, username, port=port, password=password, connect_timeout=timeout)
+        try:
+            return client.exec_command(command, timeout=timeout)
+        except (paramiko.SSHException, EOFError, OSError):
+            # The transport died between the liveness check and the channel open; reconnect once.
+            self.invalidate(hostname, username, port)
+            client = self.get_client(hostname, username, port=port, password=password, connect_timeout=timeout)
+            return client.exec_command(command, timeout=timeout)
+
+    def invalidate(self, hostname, username, port=22):
+        """Drops and closes the pooled connection for a host."""
+        with self._lock:
+            conn = self._connections.pop(self._key(hostname, username, port), None)
+        if conn:
+            self._close_quietly(conn)
+
+    def evict_idle(self):
+        """Closes connections that have been unused for longer than idle_timeout."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, conn in self._connections.items()
+                     if now - conn.last_used > self.idle_timeout or not conn.is_alive()]
+            evicted = [self._connections.pop(key) for key in stale]
+            self.evictions += len(evicted)
+        for conn in evicted:
+            self._close_quietly(conn)
+
+    def close_all(self):
+        with self._lock:
+            conns = list(self._connections.values())
+            self._connections.clear()
+        for conn in conns:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'open_connections': len(self._connections)}
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.client.close()
+        except Exception:
+            pass
+
+# Shared instance used by the web app, pipeline runner, scheduler and API.
+ssh_pool = SSHConnectionPool()
@@ -56,6 +56,12 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     let geminiApiKey = '';
+    let liveResultBlocks = null;
+    // From this many selected hosts on, /api/run returns one block per distinct result.
+    const AGGREGATE_MIN_HOSTS = 5;
+
+    // Live output from /api/run is pushed to this socket while the request is in flight.
+    const socket = (typeof io !== 'undefined') ? io() : null;
 
     const scriptSnippets = {
         'bash-script': `#!/bin/bash\necho "Hello from $(hostname)!"`,
@@ -204,12 +210,25 @@ document.addEventListener('DOMContentLoaded', () => {
                 </div>`;
     };
 
+    // Script listings carry no content; pages are followed through the X-Next-Cursor header.
+    const fetchLocalScripts = async () => {
+        const scripts = [];
+        let cursor = null;
+        do {
+            const response = await fetch(`/api/scripts/?limit=1000${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            scripts.push(...await response.json());
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return scripts;
+    };
+
     const loadAllScripts = async () => {
         DOMElements.localScriptsList.innerHTML = '<div class="placeholder"><i class="fas fa-spinner fa-spin"></i></div>';
         DOMElements.githubScriptsList.innerHTML = '<div class="placeholder"><i class="fas fa-spinner fa-spin"></i></div>';
         try {
             const [localScripts, githubScripts] = await Promise.all([
-                apiCall('/api/scripts'),
+                fetchLocalScripts(),
                 apiCall('/api/github/scripts')
             ]);
             
@@ -231,13 +250,19 @@ document.addEventListener('DOMContentLoaded', () => {
         DOMElements.runCommandBtn.disabled = true;
         if(DOMElements.runSudoCommandBtn) DOMElements.runSudoCommandBtn.disabled = true;
         DOMElements.aiAnalyzeBtn.style.display = 'none';
+        // Many hosts mostly print the same thing: ask for one block per distinct result instead of streaming every host.
+        const aggregate = selectedHostIds.length >= AGGREGATE_MIN_HOSTS;
+        liveResultBlocks = aggregate ? null : {};
         try {
-            const data = await apiCall('/api/run', { method: 'POST', body: JSON.stringify({ host_ids: selectedHostIds, command, type, use_sudo: useSudo }) });
-            displayResults(data.results);
-            if (DOMElements.aiAnalyzeBtn && data.results && data.results.length > 0) {
+            const data = await apiCall('/api/run', { method: 'POST', body: JSON.stringify({ host_ids: selectedHostIds, command, type, use_sudo: useSudo, aggregate, socket_id: socket && !aggregate ? socket.id : null }) });
+            liveResultBlocks = null;
+            if (aggregate) displayAggregatedResults(data);
+            else displayResults(data.results);
+            if (DOMElements.aiAnalyzeBtn && ((data.results && data.results.length > 0) || (data.groups && data.groups.length > 0))) {
                 DOMElements.aiAnalyzeBtn.style.display = 'inline-flex';
             }
         } catch (error) {
+            liveResultBlocks = null;
             DOMElements.resultsOutput.innerHTML = `<div class="placeholder">An error occurred.</div>`;
         } finally {
             DOMElements.runCommandBtn.disabled = false;
@@ -256,11 +281,66 @@ document.addEventListener('DOMContentLoaded', () => {
             block.className = `result-block ${res.status}`;
             const output = res.output ? `<pre class="result-content">${escapeHtml(res.output)}</pre>` : '';
             const error = res.error ? `<pre class="result-content error-output">${escapeHtml(res.error)}</pre>` : '';
-            block.innerHTML = `<div class="result-header">${res.host_name}</div>${output}${error}`;
+            // Outputs over the size caps are shortened; the full text stays downloadable.
+            const fullLinks = [['output_id', 'full output'], ['error_id', 'full error output']]
+                .filter(([key]) => res[key]).map(([key, label]) => ` <a href="/api/outputs/${res[key]}" target="_blank">${label}</a>`).join('');
+            block.innerHTML = `<div class="result-header">${res.host_name}${fullLinks}</div>${output}${error}`;
             DOMElements.resultsOutput.appendChild(block);
         });
     };
 
+    const displayAggregatedResults = (data) => {
+        DOMElements.resultsOutput.innerHTML = '';
+        if (!data.groups || data.groups.length === 0) {
+            DOMElements.resultsOutput.innerHTML = '<div class="placeholder">No results returned.</div>';
+            return;
+        }
+        const summary = document.createElement('div');
+        summary.className = 'aggregate-summary';
+        summary.textContent = `${data.host_count} hosts, ${data.group_count} distinct result${data.group_count === 1 ? '' : 's'}`;
+        DOMElements.resultsOutput.appendChild(summary);
+        data.groups.forEach(group => {
+            const block = document.createElement('div');
+            block.className = `result-block ${group.status}`;
+            const first = group.hosts[0];
+            const fullLinks = [[group.output_ids, 'full output'], [group.error_ids, 'full error output']]
+                .filter(([ids]) => ids[first]).map(([ids, label]) => ` <a href="/api/outputs/${ids[first]}" target="_blank">${label}</a>`).join('');
+            const hostList = `<details class="aggregate-hosts"><summary>${group.count} host${group.count === 1 ? '' : 's'}${group.majority && data.group_count > 1 ? ' (majority)' : ''}</summary>${group.hosts.map(escapeHtml).join(', ')}</details>`;
+            const output = group.output ? `<pre class="result-content">${escapeHtml(group.output)}</pre>` : '';
+            const error = group.error ? `<pre class="result-content error-output">${escapeHtml(group.error)}</pre>` : '';
+            // Minority groups lead with their diff against the majority; the full text stays one click away.
+            const body = group.diff
+                ? `<pre class="result-content aggregate-diff">${renderDiff(group.diff)}</pre><details><summary>Full output</summary>${output}${error}</details>`
+                : `${output}${error}`;
+            block.innerHTML = `<div class="result-header">${escapeHtml(first)}${group.count > 1 ? ` and ${group.count - 1} more` : ''}${fullLinks}</div>${hostList}${body}`;
+            DOMElements.resultsOutput.appendChild(block);
+        });
+    };
+
+    const renderDiff = (diff) => diff.split('\n').map(line => {
+        const cls = line.startsWith('@@') ? 'diff-hunk' : line.startsWith('+') && !line.startsWith('+++') ? 'diff-add' : line.startsWith('-') && !line.startsWith('---') ? 'diff-del' : '';
+        return cls ? `<span class="${cls}">${escapeHtml(line)}</span>` : escapeHtml(line);
+    }).join('\n');
+
+    const appendLiveOutput = (data) => {
+        if (!liveResultBlocks) return;
+        let block = liveResultBlocks[data.host_name];
+        if (!block) {
+            if (Object.keys(liveResultBlocks).length === 0) DOMElements.resultsOutput.innerHTML = '';
+            const el = document.createElement('div');
+            el.className = 'result-block';
+            el.innerHTML = `<div class="result-header">${data.host_name} <i class="fas fa-spinner fa-spin"></i></div><pre class="result-content"></pre><pre class="result-content error-output" style="display: none;"></pre>`;
+            DOMElements.resultsOutput.appendChild(el);
+            block = liveResultBlocks[data.host_name] = { output: el.querySelector('.result-content'), error: el.querySelector('.error-output') };
+        }
+        const target = data.stream === 'stderr' ? block.error : block.output;
+        target.style.display = '';
+        target.appendChild(document.createTextNode(data.data));
+        target.scrollTop = target.scrollHeight;
+    };
+
+    if (socket) socket.on('run_output', appendLiveOutput);
+
     const handleSettingsSubmit = async (e) => {
         e.preventDefault();
         const formData = new FormData(DOMElements.settingsForm);
@@ -363,11 +443,11 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         } else if (e.target.closest('.edit-script-btn') && !isGitHub) {
             const data = await apiCall(`/api/scripts/${scriptId}`);
-            if (data?.status === 'success') {
-                DOMElements.editScriptForm.querySelector('input[name="script_id"]').value = data.script.id;
-                DOMElements.editScriptForm.querySelector('input[name="name"]').value = data.script.name;
-                DOMElements.editScriptForm.querySelector('select[name="script_type"]').value = data.script.type;
-                DOMElements.editScriptForm.querySelector('textarea[name="content"]').value = data.script.content;
+            if (data) {
+                DOMElements.editScriptForm.querySelector('input[name="script_id"]').value = data.id;
+                DOMElements.editScriptForm.querySelector('input[name="name"]').value = data.name;
+                DOMElements.editScriptForm.querySelector('select[name="script_type"]').value = data.type;
+                DOMElements.editScriptForm.querySelector('textarea[name="content"]').value = data.content;
                 DOMElements.editScriptModal.style.display = 'flex';
             }
         } else if (e.target.closest('.push-to-github-btn') && !isGitHub) {
@@ -382,9 +462,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 if(data) DOMElements.commandInput.value = data.content;
             } else {
                 const data = await apiCall(`/api/scripts/${scriptId}`);
-                if (data?.status === 'success') {
-                    DOMElements.commandInput.value = data.script.content;
-                    DOMElements.scriptTypeInput.value = data.script.type.toLowerCase();
+                if (data) {
+                    DOMElements.commandInput.value = data.content;
+                    DOMElements.scriptTypeInput.value = data.type.toLowerCase();
                 }
             }
             showToast(`Script '${scriptItem.querySelector('strong').textContent}' loaded.`);
@@ -396,11 +476,11 @@ document.addEventListener('DOMContentLoaded', () => {
         const formData = new FormData(DOMElements.pushToGithubForm);
         const scriptId = formData.get('script_id');
         const localScript = await apiCall(`/api/scripts/${scriptId}`);
-        if (!localScript || !localScript.script) return showToast("Could not find local script.", "error");
+        if (!localScript) return showToast("Could not find local script.", "error");
 
         const payload = {
             filename: formData.get('filename'),
-            content: localScript.script.content,
+            content: localScript.content,
             type: formData.get('type'),
             commit_message: formData.get('commit_message'),
         };
@@ -419,15 +499,25 @@ document.addEventListener('DOMContentLoaded', () => {
         scriptSelect.innerHTML = [...document.querySelectorAll('#saved-scripts-list .saved-script-item')].map(item => `<option value="${item.dataset.scriptId}">${item.querySelector('.script-info strong').textContent}</option>`).join('');
     };
 
+    // Only the inputs of the selected trigger type are shown; hidden ones are disabled so they're neither required nor sent.
+    const updateScheduleTriggerFields = () => {
+        const triggerType = DOMElements.scheduleEditForm.querySelector('select[name="trigger_type"]').value;
+        DOMElements.scheduleEditForm.querySelectorAll('[data-trigger]').forEach(field => {
+            const active = field.dataset.trigger === triggerType;
+            field.style.display = active ? '' : 'none';
+            field.querySelectorAll('input').forEach(input => { input.disabled = !active; });
+        });
+    };
+
     const loadSchedules = async () => {
         const schedules = await apiCall('/api/schedules');
-        DOMElements.scheduleList.innerHTML = schedules.map(s => `<div class="schedule-item" data-schedule-id="${s.id}"><div><strong>${s.name}</strong><small>${s.host_name} &rarr; ${s.script_name} at ${String(s.hour).padStart(2,'0')}:${String(s.minute).padStart(2,'0')}</small></div><div class="schedule-actions"><button class="delete-schedule-btn icon-btn" title="Delete"><i class="fas fa-trash-alt"></i></button></div></div>`).join('') || '<div class="placeholder">No schedules.</div>';
+        DOMElements.scheduleList.innerHTML = schedules.map(s => `<div class="schedule-item" data-schedule-id="${s.id}"><div><strong>${s.name}</strong><small>${s.target} &middot; ${s.when}</small></div><div class="schedule-actions"><button class="delete-schedule-btn icon-btn" title="Delete"><i class="fas fa-trash-alt"></i></button></div></div>`).join('') || '<div class="placeholder">No schedules.</div>';
     };
     
     const handleScheduleFormSubmit = async (e) => {
         e.preventDefault();
         await apiCall('/api/schedules', { method: 'POST', body: JSON.stringify(Object.fromEntries(new FormData(DOMElements.scheduleEditForm))) });
-        showToast('Schedule saved! Restart scheduler to activate.');
+        showToast('Schedule saved!');
         DOMElements.scheduleEditModal.style.display = 'none';
         loadSchedules();
     };
@@ -437,7 +527,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const scheduleItem = e.target.closest('.schedule-item');
             if (confirm('Delete this schedule?')) {
                 await apiCall(`/api/schedules/${scheduleItem.dataset.scheduleId}`, { method: 'DELETE' });
-                showToast('Schedule deleted. Restart scheduler to deactivate.');
+                showToast('Schedule deleted.');
                 loadSchedules();
             }
         }
@@ -485,8 +575,9 @@ document.addEventListener('DOMContentLoaded', () => {
     safeAddEventListener(DOMElements.githubScriptsList, 'click', handleSavedScriptsListClick);
     safeAddEventListener(DOMElements.scriptTypeInput, 'change', (e) => { DOMElements.commandInput.value = scriptSnippets[e.target.value] || ''; });
     safeAddEventListener(DOMElements.scheduleBtn, 'click', () => { loadSchedules(); DOMElements.scheduleListModal.style.display = 'flex'; });
-    safeAddEventListener(DOMElements.addScheduleBtn, 'click', () => { DOMElements.scheduleEditForm.reset(); populateScheduleFormDropdowns(); DOMElements.scheduleEditModal.style.display = 'flex'; });
+    safeAddEventListener(DOMElements.addScheduleBtn, 'click', () => { DOMElements.scheduleEditForm.reset(); populateScheduleFormDropdowns(); updateScheduleTriggerFields(); DOMElements.scheduleEditModal.style.display = 'flex'; });
     safeAddEventListener(DOMElements.scheduleEditForm, 'submit', handleScheduleFormSubmit);
+    safeAddEventListener(DOMElements.scheduleEditForm?.querySelector('select[name="trigger_type"]'), 'change', updateScheduleTriggerFields);
     safeAddEventListener(DOMElements.scheduleList, 'click', handleScheduleListClick);
     safeAddEventListener(DOMElements.pushToGithubForm, 'submit', handlePushToGithub);
     safeAddEventListener(DOMElements.syncGithubScriptsBtn, 'click', loadAllScripts);
@@ -16,6 +16,7 @@ document.addEventListener('DOMContentLoaded', () => {
     let nextNodeId = 1;
     let selectedOutput = null;
     let scriptContentCache = {}; // Store content for both local and GH scripts
+    let currentRunId = null;
 
     const socket = io();
 
@@ -48,6 +49,7 @@ document.addEventListener('DOMContentLoaded', () => {
         if (type === 'host') headerIcon = 'fa-server';
         if (type === 'if') headerIcon = 'fa-code-branch';
         if (type === 'ai-analysis') headerIcon = 'fa-brain';
+        if (type === 'reduce-output') headerIcon = 'fa-compress-alt';
         if (type === 'discord') headerIcon = 'fab fa-discord';
         if (type === 'email') headerIcon = 'fa-envelope';
 
@@ -122,7 +124,15 @@ document.addEventListener('DOMContentLoaded', () => {
                         let step = {};
                         if (nextNode.type === 'script') {
                             let scriptContent = scriptContentCache[nextNode.scriptId] || scriptContentCache[nextNode.scriptPath];
-                            if (!scriptContent && nextNode.scriptPath) {
+                            if (!scriptContent && nextNode.scriptId && !nextNode.scriptPath) {
+                                try {
+                                    const data = await apiCall(`/api/scripts/${nextNode.scriptId}`);
+                                    scriptContent = data.content;
+                                    scriptContentCache[nextNode.scriptId] = scriptContent;
+                                } catch (e) {
+                                    scriptContent = `# Failed to load script: ${nextNode.name}`;
+                                }
+                            } else if (!scriptContent && nextNode.scriptPath) {
                                 try {
                                     const data = await apiCall(`/api/github/script-content?path=${nextNode.scriptPath}`);
                                     scriptContent = data.content;
@@ -132,7 +142,7 @@ document.addEventListener('DOMContentLoaded', () => {
                                 }
                             }
                             step = { name: `Run ${nextNode.name}`, run: scriptContent || 'Script content not found.' };
-                        } else if (nextNode.type.startsWith('ai') || nextNode.type.startsWith('discord') || nextNode.type.startsWith('email')) {
+                        } else if (nextNode.type.startsWith('ai') || nextNode.type === 'reduce-output' || nextNode.type.startsWith('discord') || nextNode.type.startsWith('email')) {
                             step = { name: nextNode.name, uses: `actions/${nextNode.type}@v1` };
                         }
                         if (Object.keys(step).length > 0) job.steps.push(step);
@@ -280,18 +290,39 @@ document.addEventListener('DOMContentLoaded', () => {
 
         runOutputLog.innerHTML = '';
         runOutputModal.style.display = 'flex';
+        if (currentRunId !== null) socket.emit('leave_run', { run_id: currentRunId });
+        currentRunId = null;
 
         try {
-            await apiCall(`/api/pipelines/${PIPELINE_ID}/run`, {
+            // The server subscribes this socket to the run's room before starting it when it can;
+            // joining again is harmless and covers a socket connected to another server process.
+            const result = await apiCall(`/api/pipelines/${PIPELINE_ID}/run`, {
                 method: 'POST',
-                body: JSON.stringify({ dry_run: isDryRun })
+                body: JSON.stringify({ dry_run: isDryRun, socket_id: socket.id })
             });
+            currentRunId = result.run_id;
+            socket.emit('join_run', { run_id: currentRunId });
         } catch (e) {
             console.error("Failed to start pipeline run:", e);
         }
     };
 
-    socket.on('pipeline_log', (data) => {
+    let liveOutput = null;
+
+    const appendOutputChunk = (data) => {
+        if (!liveOutput || liveOutput.closest('.log-entry') !== runOutputLog.lastElementChild) {
+            const logContainer = document.createElement('div');
+            logContainer.className = 'log-entry';
+            logContainer.innerHTML = `<div class="log-line output"><span class="icon"><i class="fas fa-stream"></i></span><span>Live output</span></div><div class="log-content" style="display: block;"><pre></pre></div>`;
+            runOutputLog.appendChild(logContainer);
+            liveOutput = logContainer.querySelector('pre');
+        }
+        liveOutput.appendChild(document.createTextNode(data.message));
+    };
+
+    const renderLogEntry = (data) => {
+        if (data.type === 'output_chunk') return appendOutputChunk(data);
+        if (data.type === 'finished') data = { type: data.message === 'success' ? 'success' : 'info', message: `Run finished with status: ${data.message}` };
         const logContainer = document.createElement('div');
         logContainer.className = 'log-entry';
 
@@ -340,9 +371,20 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         
         runOutputLog.appendChild(logContainer);
+    };
+
+    // Logs arrive in batched frames for the run this socket joined.
+    socket.on('pipeline_log_batch', (batch) => {
+        if (currentRunId !== null && batch.run_id !== currentRunId) return;
+        batch.entries.forEach(renderLogEntry);
         runOutputLog.scrollTop = runOutputLog.scrollHeight;
     });
 
+    // Rejoin the current run's room after a reconnect.
+    socket.on('connect', () => {
+        if (currentRunId !== null) socket.emit('join_run', { run_id: currentRunId });
+    });
+
     const escapeHtml = (unsafe) => unsafe.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;");
 
     const renderGroupedScripts = (scripts, targetElement, isGitHub) => {
@@ -414,14 +456,27 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // --- Initial Load ---
+    // Script listings carry no content; pages are followed through the X-Next-Cursor header.
+    const fetchLocalScripts = async () => {
+        const scripts = [];
+        let cursor = null;
+        do {
+            const response = await fetch(`/api/scripts/?limit=1000${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            scripts.push(...await response.json());
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return scripts;
+    };
+
     const initializeEditor = async () => {
         try {
             const [localScripts, githubScripts] = await Promise.all([
-                apiCall('/api/scripts'),
+                fetchLocalScripts(),
                 apiCall('/api/github/scripts')
             ]);
             
-            localScripts.forEach(script => { scriptContentCache[script.id] = script.content; });
+            // Local script content is fetched when the YAML preview first needs it.
             renderGroupedScripts(localScripts, localScriptListContainer);
 
             if (githubScripts && githubScripts.length > 0) {
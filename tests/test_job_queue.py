@@ -0,0 +1,159 @@
+# tests/test_job_queue.py
+import pytest
+
+import job_queue
+from job_queue import JobQueue, SQLiteJobQueue
+
+LEASE = 60
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue.time, 'time', clock)
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return SQLiteJobQueue(str(tmp_path / 'jobs.db'), lease_seconds=LEASE)
+
+def enqueue(queue, clock, name, **kwargs):
+    # created_at orders the queue, so each job gets its own tick.
+    clock.now += 1
+    return queue.enqueue('run', {'name': name}, **kwargs)
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+def test_claim_takes_oldest_queued_job(queue, clock):
+    first = enqueue(queue, clock, 'first')
+    enqueue(queue, clock, 'second')
+    job = queue.claim('w1')
+    assert job['id'] == first
+    assert job['status'] == 'running'
+    assert job['worker_id'] == 'w1'
+    assert job['attempts'] == 1
+    assert job['payload'] == {'name': 'first'}
+
+def test_claim_returns_none_when_nothing_is_queued(queue, clock):
+    assert queue.claim('w1') is None
+    enqueue(queue, clock, 'only')
+    assert queue.claim('w1') is not None
+    assert queue.claim('w2') is None
+
+def test_claim_respects_group_limit(queue, clock):
+    enqueue(queue, clock, 'a', group_id=1)
+    enqueue(queue, clock, 'b', group_id=1)
+    other = enqueue(queue, clock, 'c', group_id=2)
+    assert queue.claim('w1', max_per_group=1)['payload'] == {'name': 'a'}
+    # The second group-1 job is skipped, not blocking the queue behind it.
+    assert queue.claim('w1', max_per_group=1)['id'] == other
+    assert queue.claim('w1', max_per_group=1) is None
+
+def test_claim_respects_host_limit(queue, clock):
+    enqueue(queue, clock, 'a', host_keys=[1, 2])
+    enqueue(queue, clock, 'b', host_keys=[2])
+    free = enqueue(queue, clock, 'c', host_keys=[3])
+    assert queue.claim('w1', max_per_host=1)['payload'] == {'name': 'a'}
+    assert queue.claim('w1', max_per_host=1)['id'] == free
+    assert queue.claim('w1', max_per_host=1) is None
+
+def test_complete_records_result(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    assert queue.complete(job_id, 'w1', {'ok': True}) is True
+    job = queue.get(job_id)
+    assert job['status'] == 'success'
+    assert job['result'] == {'ok': True}
+    assert job['finished_at'] == clock.now
+
+def test_fail_records_error(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    assert queue.fail(job_id, 'w1', ValueError('boom')) is True
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert job['error'] == 'boom'
+
+def test_finish_requires_the_worker_holding_the_job(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    assert queue.complete(job_id, 'w2', {'ok': True}) is False
+    assert queue.get(job_id)['status'] == 'running'
+    assert queue.complete(job_id, 'w1', {'ok': True}) is True
+    # A finished job can't be finished again.
+    assert queue.fail(job_id, 'w1', 'late') is False
+    assert queue.get(job_id)['status'] == 'success'
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    clock.now += LEASE - 1
+    assert queue.claim('w2') is None
+    clock.now += 2
+    job = queue.claim('w2')
+    assert job['id'] == job_id
+    assert job['worker_id'] == 'w2'
+    assert job['attempts'] == 2
+
+def test_heartbeat_extends_the_lease(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    clock.now += LEASE - 1
+    queue.heartbeat(job_id, 'w1')
+    clock.now += LEASE - 1
+    assert queue.claim('w2') is None
+    assert queue.get(job_id)['worker_id'] == 'w1'
+
+def test_heartbeat_from_another_worker_does_not_extend_the_lease(queue, clock):
+    enqueue(queue, clock, 'a')
+    job = queue.claim('w1')
+    clock.now += LEASE - 1
+    queue.heartbeat(job['id'], 'w2')
+    clock.now += 2
+    assert queue.claim('w2')['id'] == job['id']
+
+def test_stale_worker_cannot_overwrite_the_new_owner(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    queue.claim('w1')
+    clock.now += LEASE + 1
+    queue.claim('w2')
+    assert queue.complete(job_id, 'w1', {'from': 'w1'}) is False
+    assert queue.complete(job_id, 'w2', {'from': 'w2'}) is True
+    assert queue.get(job_id)['result'] == {'from': 'w2'}
+
+def test_job_fails_after_max_attempts(queue, clock):
+    job_id = enqueue(queue, clock, 'a')
+    for attempt in range(1, 3):
+        assert queue.claim(f'w{attempt}', max_attempts=2)['attempts'] == attempt
+        clock.now += LEASE + 1
+    assert queue.claim('w3', max_attempts=2) is None
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert job['worker_id'] is None
+    assert 'Lease expired on each of 2 attempts' in job['error']
+    assert queue.complete(job_id, 'w2', {}) is False
+
+def test_max_attempts_zero_retries_forever(queue, clock):
+    enqueue(queue, clock, 'a')
+    for attempt in range(1, 6):
+        assert queue.claim('w1', max_attempts=0)['attempts'] == attempt
+        clock.now += LEASE + 1
+
+def test_list_and_stats(queue, clock):
+    done = enqueue(queue, clock, 'a', group_id=1)
+    enqueue(queue, clock, 'b', group_id=1)
+    enqueue(queue, clock, 'c', group_id=2)
+    queue.claim('w1')
+    queue.complete(done, 'w1')
+    assert queue.stats() == {'success': 1, 'queued': 2}
+    assert [job['payload']['name'] for job in queue.list(group_id=1)] == ['b', 'a']
+    assert [job['payload']['name'] for job in queue.list(status='queued')] == ['c', 'b']
+    assert 'result' not in queue.list()[0]
@@ -0,0 +1,129 @@
+# tests/test_notifications.py
+import threading
+
+import pytest
+
+from notifications import NotificationDispatcher, DISCORD_MAX_EMBEDS
+
+WEBHOOK = 'https://discord.example/webhook'
+SMTP_CONFIG = {'EMAIL_TO': 'ops@example.com', 'SMTP_SERVER': 'smtp.example.com', 'SMTP_PORT': '587',
+               'SMTP_USER': 'launcher', 'SMTP_PASSWORD': 'secret'}
+
+class Results:
+    """Collects on_result callbacks and lets a test wait for a number of them."""
+
+    def __init__(self):
+        self.calls = []
+        self._cond = threading.Condition()
+
+    def __call__(self, ok, message):
+        with self._cond:
+            self.calls.append((ok, message))
+            self._cond.notify_all()
+
+    def wait_for(self, count, timeout=5):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.calls) >= count, timeout), f"got {len(self.calls)} of {count} results"
+        return self.calls
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = NotificationDispatcher(max_retries=2, backoff=0)
+    dispatcher.posts = []
+    dispatcher.emails = []
+    dispatcher._post_discord = lambda url, embeds: dispatcher.posts.append((url, embeds))
+    dispatcher._send_smtp = lambda smtp, subject, html: dispatcher.emails.append((smtp['EMAIL_TO'], subject, html))
+    yield dispatcher
+    dispatcher.stop(timeout=5)
+
+def failing(times, sink):
+    """A transport that raises `times` times, then records what it was sent."""
+    attempts = []
+
+    def send(*args):
+        attempts.append(args)
+        if len(attempts) <= times:
+            raise ConnectionError(f"attempt {len(attempts)} failed")
+        sink.append(args)
+    send.attempts = attempts
+    return send
+
+def test_incomplete_settings_are_not_queued(dispatcher):
+    assert dispatcher.send_discord({}, {'title': 'x'}) is False
+    assert dispatcher.send_email({**SMTP_CONFIG, 'SMTP_PASSWORD': ''}, 'subject', '<p>x</p>') is False
+    assert dispatcher.pending() == 0
+
+def test_discord_message_is_delivered(dispatcher):
+    results = Results()
+    assert dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK}, {'title': 'one'}, on_result=results) is True
+    assert results.wait_for(1) == [(True, "Discord notification sent.")]
+    assert dispatcher.posts == [(WEBHOOK, [{'title': 'one'}])]
+    assert dispatcher.sent == 1
+
+def test_retries_until_delivered(dispatcher):
+    results = Results()
+    dispatcher._post_discord = failing(2, dispatcher.posts)
+    dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK}, {'title': 'flaky'}, on_result=results)
+    assert results.wait_for(1) == [(True, "Discord notification sent.")]
+    assert len(dispatcher._post_discord.attempts) == 3
+    assert dispatcher.sent == 1 and dispatcher.failed == 0
+
+def test_gives_up_after_max_retries(dispatcher):
+    results = Results()
+    dispatcher._send_smtp = failing(10, dispatcher.emails)
+    dispatcher.send_email(SMTP_CONFIG, 'Report', '<p>x</p>', on_result=results)
+    ok, message = results.wait_for(1)[0]
+    assert ok is False
+    assert message == "Failed to send email: attempt 3 failed"
+    assert len(dispatcher._send_smtp.attempts) == 3
+    assert dispatcher.emails == []
+    assert dispatcher.failed == 1
+
+def test_digest_merges_emails_within_the_window(dispatcher):
+    results = Results()
+    config = {**SMTP_CONFIG, 'NOTIFY_DIGEST_WINDOW': 0.3}
+    for index in range(3):
+        dispatcher.send_email(config, f"Report {index}", f"<p>{index}</p>", on_result=results)
+    calls = results.wait_for(3)
+    assert all(ok for ok, _ in calls)
+    assert dispatcher.emails == [('ops@example.com', "Digest: 3 reports", "<p>0</p><hr><p>1</p><hr><p>2</p>")]
+    assert dispatcher.sent == 3
+
+def test_digest_keeps_targets_apart(dispatcher):
+    results = Results()
+    other_hook = WEBHOOK + '/other'
+    dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK, 'NOTIFY_DIGEST_WINDOW': 0.3}, {'title': 'a'}, on_result=results)
+    dispatcher.send_discord({'DISCORD_WEBHOOK_URL': other_hook, 'NOTIFY_DIGEST_WINDOW': 0.3}, {'title': 'b'}, on_result=results)
+    dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK, 'NOTIFY_DIGEST_WINDOW': 0.3}, {'title': 'c'}, on_result=results)
+    results.wait_for(3)
+    assert sorted(dispatcher.posts) == [(WEBHOOK, [{'title': 'a'}, {'title': 'c'}]), (other_hook, [{'title': 'b'}])]
+
+def test_discord_digest_is_split_into_embed_limited_posts(dispatcher):
+    results = Results()
+    count = DISCORD_MAX_EMBEDS + 3
+    for index in range(count):
+        dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK, 'NOTIFY_DIGEST_WINDOW': 0.3}, {'title': str(index)}, on_result=results)
+    results.wait_for(count)
+    assert [len(embeds) for _, embeds in dispatcher.posts] == [DISCORD_MAX_EMBEDS, 3]
+
+def test_without_a_window_messages_go_out_one_by_one(dispatcher):
+    results = Results()
+    for index in range(2):
+        dispatcher.send_email(SMTP_CONFIG, f"Report {index}", f"<p>{index}</p>", on_result=results)
+    results.wait_for(2)
+    assert [subject for _, subject, _ in dispatcher.emails] == ["Report 0", "Report 1"]
+
+def test_stop_delivers_what_is_still_queued(dispatcher):
+    release = threading.Event()
+    delivered = []
+
+    def slow_post(url, embeds):
+        release.wait(5)
+        delivered.append(embeds)
+    dispatcher._post_discord = slow_post
+    for index in range(3):
+        dispatcher.send_discord({'DISCORD_WEBHOOK_URL': WEBHOOK}, {'title': str(index)})
+    release.set()
+    dispatcher.stop(timeout=5)
+    assert delivered == [[{'title': '0'}], [{'title': '1'}], [{'title': '2'}]]
+    assert dispatcher.pending() == 0
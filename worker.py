@@ -0,0 +1,104 @@
+# worker.py
+# Consumes the job queue configured with JOB_QUEUE_BACKEND (see job_queue.py).
+# Run one or more of these next to the web server:
+#   python worker.py --concurrency 4
+# Set SOCKETIO_MESSAGE_QUEUE for both processes so live logs reach the browser.
+import argparse
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, socketio, load_config, execute_on_hosts
+from job_queue import get_job_queue, DEFAULT_MAX_ATTEMPTS, DEFAULT_MAX_PER_GROUP, DEFAULT_MAX_PER_HOST
+from run_pipeline import PipelineRunner
+from ssh_pool import ssh_pool
+from notifications import notification_dispatcher
+from analysis import analysis_service
+
+POLL_INTERVAL = 1.0
+
+def run_job(job):
+    """Executes a claimed job and returns its result payload."""
+    payload = job['payload']
+    if job['kind'] == 'pipeline':
+        runner = PipelineRunner(payload['pipeline_id'], app, socketio, payload.get('dry_run', False), run_id=payload.get('run_id'))
+        runner.run()
+        return {'run_id': payload.get('run_id')}
+    if job['kind'] == 'run':
+        return execute_on_hosts(payload['targets'], payload['command'], payload['script_type'], payload['use_sudo'],
+                                payload['timeout'], payload['max_parallel'], payload['stream_settings'], payload.get('aggregate'))
+    raise ValueError(f"Unknown job kind '{job['kind']}'.")
+
+def process(queue, job, worker_id):
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(queue.lease_seconds / 3):
+            queue.heartbeat(job['id'], worker_id)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        recorded = queue.complete(job['id'], worker_id, run_job(job))
+        print(f"Job {job['id']} ({job['kind']}) finished.")
+    except Exception as e:
+        recorded = queue.fail(job['id'], worker_id, e)
+        print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+    finally:
+        stop_heartbeat.set()
+    if not recorded:
+        print(f"Job {job['id']}: lease lost before it finished; the result was not recorded.")
+
+def main():
+    parser = argparse.ArgumentParser(description='Remote Script Launcher job worker')
+    parser.add_argument('--concurrency', type=int, default=None, help='Jobs this worker runs at once (default: WORKER_CONCURRENCY or 4).')
+    args = parser.parse_args()
+
+    config = load_config()
+    queue = get_job_queue(config)
+    if not queue:
+        raise SystemExit("JOB_QUEUE_BACKEND is 'inline'; set it to 'sqlite' in config.json to use workers.")
+
+    concurrency = args.concurrency or int(config.get('WORKER_CONCURRENCY', 4))
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    slots = threading.Semaphore(concurrency)
+    print(f"Worker {worker_id} started with concurrency {concurrency}. Press Ctrl+C to exit.")
+
+    def release_slot(_):
+        slots.release()
+
+    # SIGTERM (systemd, docker stop) and Ctrl+C both stop claiming and let running jobs finish,
+    # heartbeating their leases meanwhile, so nothing is left to expire and burn a retry.
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        if not stop_event.is_set():
+            print("Shutting down; waiting for running jobs to finish...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while not stop_event.is_set():
+            if not slots.acquire(timeout=POLL_INTERVAL):
+                continue
+            # Re-read limits each claim so config changes apply without restarting workers.
+            config = load_config()
+            job = queue.claim(worker_id,
+                              max_per_group=int(config.get('JOB_MAX_PER_GROUP', DEFAULT_MAX_PER_GROUP)),
+                              max_per_host=int(config.get('JOB_MAX_PER_HOST', DEFAULT_MAX_PER_HOST)),
+                              max_attempts=int(config.get('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+            if not job:
+                slots.release()
+                stop_event.wait(POLL_INTERVAL)
+                continue
+            executor.submit(process, queue, job, worker_id).add_done_callback(release_slot)
+    analysis_service.stop()
+    notification_dispatcher.stop()
+    ssh_pool.close_all()
+
+if __name__ == '__main__':
+    main()